@@ -0,0 +1,47 @@
+'''
+Measure the memory used by the model classes with tracemalloc.
+'''
+from datetime import datetime
+import sys
+import tracemalloc
+from frcpy.models import Location, Match, MatchAlliance, MatchVideo, Team, TeamEventStats, TeamYearStats
+
+
+def make_team(number: int) -> Team:
+    return Team(f"frc{number}", f"Team {number}", f"Sponsors of team {number}",
+                Location('Minneapolis', 'MN', 'USA'),
+                f"School {number}", 'https://example.com', 2000 + number % 20, None)
+
+
+def make_match(number: int) -> Match:
+    time = datetime.fromtimestamp(1646000000 + number * 600)
+    return Match(f"2022mnmi_qm{number}", 'qm', 1, number, 50 + number % 40, 60 - number % 30,
+                 MatchAlliance([f"frc{number}", f"frc{number + 1}", f"frc{number + 2}"], [], []),
+                 MatchAlliance([f"frc{number + 3}", f"frc{number + 4}", f"frc{number + 5}"], [], []),
+                 'red', time, time, time, time,
+                 [MatchVideo('youtube', f"video{number}")])
+
+
+def make_team_year_stats(number: int) -> TeamYearStats:
+    return TeamYearStats(f"frc{number}", 2022, *[float(i) for i in range(39)])
+
+
+def make_team_event_stats(number: int) -> TeamEventStats:
+    return TeamEventStats(f"frc{number}", '2022mnmi', *[float(i) for i in range(38)])
+
+
+def measure(name: str, factory, count: int) -> None:
+    tracemalloc.start()
+    objects = [factory(i) for i in range(count)]
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:16} {count:>8} objects {current / count:>8.0f} bytes each "
+          f"(shallow {sys.getsizeof(objects[0])}, peak {peak / 2 ** 20:.1f} MiB)")
+
+
+if __name__ == '__main__':
+    COUNT = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    measure('Team', make_team, COUNT)
+    measure('Match', make_match, COUNT)
+    measure('TeamYearStats', make_team_year_stats, COUNT)
+    measure('TeamEventStats', make_team_event_stats, COUNT)
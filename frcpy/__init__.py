@@ -2,4 +2,9 @@
 Interact with the TBA and Statbotics APIs
 '''
 from .main import FRCPy
-from .models import Location, Team, TeamYearStats, Webcast, Event, MatchAlliance, MatchVideo, Match
+from .expiry import ExpiryPolicy, SeasonExpiryPolicy
+from .elo import Elo
+from .opr import IncrementalOPR
+from .simulation import AllianceSelection, BracketSimulator, RankingSimulator, Rankings
+from .workers import Sweeper
+from .models import Location, Team, TeamYearStats, StatsTable, Webcast, Event, MatchAlliance, MatchVideo, Match
@@ -1,23 +1,95 @@
 '''
 Cache for the FRCPy class
 '''
-from datetime import datetime, timedelta
+from datetime import datetime
+from typing import Callable, Iterator
+import calendar
+import math
 import os
+import re
+import sys
+import time
 import sqlite3
-import json
-from .models import Location, PreciseLocation, Team, TeamEventStats, TeamYearStats, Webcast, Event, MatchAlliance, MatchVideo, Match
+import numpy as np
+from . import opr, serialization
+from .expiry import ExpiryPolicy
+from .models import Location, PreciseLocation, Team, TeamEventStats, TeamYearStats, StatsTable, Event, Match
 
 
 class Cache:
     '''
     Class to cache data
     '''
+    # Columns identifying a row of each table
+    __KEY_COLUMNS = {
+        'team_index': (),
+        'teams': ('key',),
+        'team_years': ('key',),
+        'team_year_events': ('key', 'year'),
+        'year_events': ('year',),
+        'events': ('key',),
+        'event_teams': ('event',),
+        'event_matches': ('event',),
+        'team_event_matches': ('team', 'event'),
+        'matches': ('key',),
+        'team_year_matches': ('team', 'year'),
+        'team_year_stats': ('team_key', 'year'),
+        'team_event_stats': ('team_key', 'event_key'),
+        'year_stats': ('year',),
+        'event_stats': ('event',),
+        'event_oprs': ('event', 'qualifications_only'),
+        'team_precise_locations': ('team_key',),
+        'precise_distances': ('origin_id', 'destination_id')
+    }
+    # Expressions giving the season of a row, for tables holding season data
+    __YEAR_COLUMNS = {
+        'team_year_events': 'year',
+        'year_events': 'year',
+        'events': 'year',
+        'event_teams': 'CAST(substr(event, 1, 4) AS int)',
+        'event_matches': 'CAST(substr(event, 1, 4) AS int)',
+        'team_event_matches': 'CAST(substr(event, 1, 4) AS int)',
+        'matches': 'year',
+        'team_year_matches': 'year',
+        'team_year_stats': 'year',
+        'team_event_stats': 'CAST(substr(event_key, 1, 4) AS int)',
+        'year_stats': 'year',
+        'event_stats': 'CAST(substr(event, 1, 4) AS int)',
+        'event_oprs': 'CAST(substr(event, 1, 4) AS int)'
+    }
 
-    def __init__(self, cache_dir: str = './cache'):
+    # Number of buffered accesses, or of writes, after which budgets are enforced
+    __ACCESS_FLUSH = 1024
+    __EVICT_INTERVAL = 1024
+    __DAY = 24 * 60 * 60
+    # Columns of the full text search indexes and their weight in ranking matches
+    __SEARCH_COLUMNS = {
+        'teams': {'nickname': 10.0, 'name': 1.0, 'school_name': 4.0, 'city': 2.0, 'team_number': 10.0},
+        'events': {'name': 2.0, 'short_name': 4.0}
+    }
+    # Schema version stored in the database's user_version
+    __VERSION = 3
+
+    def __init__(self, cache_dir: str = './cache', max_stale: float = 0,
+                 on_stale: Callable[[str, tuple], bool] | None = None,
+                 max_rows: dict[str, int] | None = None, max_bytes: dict[str, int] | None = None):
+        '''
+        `max_rows` and `max_bytes` optionally limit the size of individual
+        tables, the least recently used rows are evicted in bulk to meet them.
+        '''
         if not os.path.exists(cache_dir):
             os.mkdir(cache_dir)
+        self.__cache_dir = cache_dir
         self.__connection = sqlite3.connect(
-            os.path.join(cache_dir, 'cache.db'))
+            os.path.join(cache_dir, 'cache.db'), timeout=30)
+        self.__max_stale = max_stale
+        self.__on_stale = on_stale
+        self.__max_rows = max_rows if max_rows is not None else {}
+        self.__max_bytes = max_bytes if max_bytes is not None else {}
+        self.__accessed: dict[str, dict[tuple, int]] = {}
+        self.__access_count = 0
+        self.__write_count = 0
+        self.__breakdown_columns: dict[int, dict[str, str]] = {}
         self.__init_team_index()
         self.__init_teams()
         self.__init_team_years()
@@ -28,49 +100,387 @@ class Cache:
         self.__init_event_matches()
         self.__init_team_event_matches()
         self.__init_match()
+        self.__init_match_teams()
+        self.__init_team_year_matches()
         self.__init_team_year_stats()
         self.__init_team_event_stats()
+        self.__init_year_stats()
+        self.__init_event_stats()
+        self.__init_event_oprs()
         self.__init_team_precise_locations()
         self.__init_precise_distances()
+        self.__init_key_indexes()
+        self.__init_search()
+        self.__migrate()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.flush_access()
         self.__connection.close()
 
     def _connection(self) -> sqlite3.Connection:
         return self.__connection
 
+    def cache_dir(self) -> str:
+        '''Returns the directory of this cache'''
+        return self.__cache_dir
+
+    def __cutoffs(self, cache_expiry: float) -> tuple[int, int]:
+        '''
+        Returns the epoch times rows must be updated after to be fresh, and to
+        be returned at all. Rows between the two are within the stale window.
+        '''
+        now = time.time()
+        fresh = int(now - cache_expiry * Cache.__DAY)
+        if self.__on_stale is None:
+            return fresh, fresh
+        return fresh, int(now - (cache_expiry + self.__max_stale) * Cache.__DAY)
+
+    def __expired(self, timestamp: int, fresh: int, table: str, key: tuple) -> bool:
+        '''
+        Check whether a row returned by a query has expired, recording the
+        access if it hasn't. Rows within the stale window are reported to the
+        stale handler, and kept if it accepts them.
+        '''
+        if timestamp < fresh and not self.__on_stale(table, key):
+            return True
+        self.__accessed.setdefault(table, {})[key] = int(time.time())
+        self.__access_count += 1
+        if self.__access_count >= Cache.__ACCESS_FLUSH:
+            self.flush_access()
+        return False
+
+    @staticmethod
+    def __epoch(timestamp: datetime | None) -> int | None:
+        '''Converts a local time from TBA to epoch seconds'''
+        if timestamp is None:
+            return None
+        return int(timestamp.timestamp())
+
+    def __written(self) -> None:
+        self.__write_count += 1
+        if self.__write_count >= Cache.__EVICT_INTERVAL and \
+                (len(self.__max_rows) > 0 or len(self.__max_bytes) > 0):
+            self.evict()
+
+    def __where(self, table: str) -> str:
+        columns = Cache.__KEY_COLUMNS[table]
+        if len(columns) == 0:
+            return '1'
+        return ' AND '.join(f"{column} = ?" for column in columns)
+
+    def __add_column(self, table: str, column: str, column_type: str) -> None:
+        '''Add a column to a table created by an older version of the cache'''
+        columns = [row[1] for row in self.__connection.execute(f"PRAGMA table_xinfo({table})")]
+        if column not in columns:
+            self.__connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def __add_team_number(self, table: str, team_key: str) -> None:
+        '''Add a column holding the team number of the team key in `team_key`'''
+        self.__add_column(table, 'team_number',
+                          f"int GENERATED ALWAYS AS (CAST(substr({team_key}, 4) AS int)) VIRTUAL")
+
+    def __init_key_indexes(self) -> None:
+        for table, columns in Cache.__KEY_COLUMNS.items():
+            if len(columns) > 0:
+                self.__connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_key ON {table} ({', '.join(columns)})")
+        self.__connection.commit()
+
+    def __migrate(self) -> None:
+        '''Migrate data written by older versions of the cache, tracked by the user version'''
+        version, = self.__connection.execute('PRAGMA user_version').fetchone()
+        if version < 1:
+            self.__migrate_iso_timestamps()
+        if version < 2:
+            self.__migrate_match_teams()
+        if version < 3:
+            self.__migrate_nested_json()
+        self.__connection.execute(f"PRAGMA user_version = {Cache.__VERSION}")
+        self.__connection.commit()
+
+    def __migrate_iso_timestamps(self) -> None:
+        '''Convert ISO timestamps to epoch seconds'''
+        for table in Cache.__KEY_COLUMNS:
+            for column in ('last_updated', 'last_accessed'):
+                self.__connection.execute(
+                    f"UPDATE {table} SET {column} = CAST(strftime('%s', {column}) AS int) "
+                    f"WHERE typeof({column}) = 'text'")
+        # Event dates are stored as UTC midnight, match times were stored in local time
+        for column in ('start_date', 'end_date'):
+            self.__connection.execute(
+                f"UPDATE events SET {column} = CAST(strftime('%s', {column}) AS int) "
+                f"WHERE typeof({column}) = 'text'")
+        for column in ('scheduled_time', 'predicted_time', 'actual_time', 'result_time'):
+            self.__connection.execute(
+                f"UPDATE matches SET {column} = CAST(strftime('%s', {column}, 'utc') AS int) "
+                f"WHERE typeof({column}) = 'text'")
+        self.__connection.commit()
+
+    def __migrate_match_teams(self) -> None:
+        '''Fill the match participants from the alliances of cached matches'''
+        for alliance in ('red', 'blue'):
+            self.__connection.execute(
+                f"INSERT INTO match_teams "
+                f"SELECT matches.key, event, year, team.value, '{alliance}', team.key + 1, "
+                f"team.value IN (SELECT value FROM json_each({alliance}_teams, '$.dq')), "
+                f"team.value IN (SELECT value FROM json_each({alliance}_teams, '$.surrogate')) "
+                f"FROM matches, json_each({alliance}_teams, '$.teams') AS team")
+        self.__connection.commit()
+
+    def __migrate_nested_json(self) -> None:
+        '''Decode webcasts and videos that were stored as lists of JSON strings'''
+        for table, column in (('events', 'webcasts'), ('matches', 'videos')):
+            self.__connection.execute(
+                f"UPDATE {table} SET {column} = "
+                f"(SELECT json_group_array(json(value)) FROM json_each({column})) "
+                f"WHERE EXISTS (SELECT 1 FROM json_each({column}) WHERE type = 'text')")
+        self.__connection.commit()
+
+    def flush_access(self) -> None:
+        '''Write the buffered access times of rows read from the cache'''
+        for table, accessed in self.__accessed.items():
+            self.__connection.executemany(
+                f"UPDATE {table} SET last_accessed = ? WHERE {self.__where(table)}",
+                [(timestamp, *key) for key, timestamp in accessed.items()])
+        self.__connection.commit()
+        self.__accessed = {}
+        self.__access_count = 0
+
+    def __table_size(self, table: str) -> int:
+        try:
+            size, = self.__connection.execute(
+                'SELECT SUM(pgsize) FROM dbstat WHERE name = ?', [table]).fetchone()
+        except sqlite3.OperationalError:
+            # SQLite was built without dbstat, estimate from the stored values
+            columns = [row[1] for row in self.__connection.execute(f"PRAGMA table_info({table})")]
+            lengths = ' + '.join(f"IFNULL(LENGTH(CAST({column} AS blob)), 0)" for column in columns)
+            size, = self.__connection.execute(f"SELECT SUM({lengths}) FROM {table}").fetchone()
+        return size if size is not None else 0
+
+    def evict(self) -> dict[str, int]:
+        '''
+        Evict the least recently used rows of every table over its budget,
+        returning the number of rows evicted from each table
+        '''
+        self.flush_access()
+        self.__write_count = 0
+        evicted = {}
+        for table in self.__max_rows.keys() | self.__max_bytes.keys():
+            count, = self.__connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+            excess = count - self.__max_rows.get(table, count)
+            if table in self.__max_bytes:
+                size = self.__table_size(table)
+                if size > self.__max_bytes[table]:
+                    excess = max(excess, math.ceil(count * (size - self.__max_bytes[table]) / size))
+            if excess <= 0:
+                continue
+            # Rows that were never read count as accessed when they were written
+            cursor = self.__connection.execute(
+                f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} "
+                f"ORDER BY IFNULL(last_accessed, last_updated) LIMIT ?)", [excess])
+            evicted[table] = cursor.rowcount
+        self.__connection.commit()
+        return evicted
+
+    def get_last_modified(self, table: str, key: tuple) -> str | None:
+        '''Get the Last-Modified header TBA sent for a row, even if it has expired'''
+        cursor = self.__connection.cursor()
+        cursor.execute(f"SELECT last_modified FROM {table} WHERE {self.__where(table)}", key)
+        result = cursor.fetchone()
+        cursor.close()
+        if result is None:
+            return None
+        return result[0]
+
+    def touch(self, table: str, key: tuple) -> None:
+        '''Renew a row that is known to be unchanged'''
+        self.__connection.execute(f"UPDATE {table} SET last_updated = ? WHERE {self.__where(table)}",
+                                  [int(time.time()), *key])
+        self.__connection.commit()
+
+    def sweep(self, cache_expiry: float = 90, past_season_expiry: float | None = None,
+              expiry_policy: ExpiryPolicy | None = None) -> dict[str, int]:
+        '''
+        Delete every row older than `cache_expiry` days, returning the number of
+        rows deleted from each table. Rows belonging to a season use the expiry
+        `expiry_policy` gives the season when it is given, so seasons it keeps
+        permanently aren't swept, and rows belonging to seasons before the
+        current one use `past_season_expiry` when it is given.
+        '''
+        now = time.time()
+        current_year = datetime.utcnow().year
+        deleted = {}
+        for table in Cache.__KEY_COLUMNS:
+            year = Cache.__YEAR_COLUMNS.get(table)
+            if year is None or (past_season_expiry is None and expiry_policy is None):
+                cursor = self.__connection.execute(
+                    f"DELETE FROM {table} WHERE last_updated < ?",
+                    [int(now - cache_expiry * Cache.__DAY)])
+                deleted[table] = cursor.rowcount
+                continue
+            deleted[table] = 0
+            seasons = [season for season, in self.__connection.execute(
+                f"SELECT DISTINCT {year} FROM {table}")]
+            for season in seasons:
+                expiry = cache_expiry
+                if expiry_policy is not None and season is not None:
+                    expiry = expiry_policy.year_expiry(cache_expiry, season)
+                if past_season_expiry is not None and season is not None and season < current_year:
+                    expiry = past_season_expiry
+                cursor = self.__connection.execute(
+                    f"DELETE FROM {table} WHERE {year} IS ? AND last_updated < ?",
+                    [season, int(now - expiry * Cache.__DAY)])
+                deleted[table] += cursor.rowcount
+        self.__connection.commit()
+        return deleted
+
+    def size(self) -> int:
+        '''Returns the size of the cache database in bytes'''
+        page_count, = self.__connection.execute('PRAGMA page_count').fetchone()
+        page_size, = self.__connection.execute('PRAGMA page_size').fetchone()
+        return page_count * page_size
+
+    def compact(self, incremental: bool = False) -> int:
+        '''
+        Refresh the query planner statistics and release free pages, returning
+        the number of bytes reclaimed. A full compaction rewrites the database
+        and enables incremental vacuuming, so later compactions can be
+        incremental and only release the free pages.
+        '''
+        before = self.size()
+        self.__connection.execute('ANALYZE')
+        self.__connection.commit()
+        auto_vacuum, = self.__connection.execute('PRAGMA auto_vacuum').fetchone()
+        if incremental and auto_vacuum == 2:
+            self.__connection.execute('PRAGMA incremental_vacuum')
+        else:
+            self.__connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            self.__connection.execute('VACUUM')
+            # Vacuuming can renumber the rows the search indexes refer to
+            self.__rebuild_search()
+        self.__connection.commit()
+        return before - self.size()
+
+    def __init_search(self) -> None:
+        '''
+        Index the names of teams and events for full text search. The indexes
+        read their text from the tables and are kept current by triggers.
+        '''
+        self.__full_text = True
+        for table, weights in Cache.__SEARCH_COLUMNS.items():
+            columns = list(weights)
+            indexed = [row[1] for row in self.__connection.execute(f"PRAGMA table_info({table}_search)")]
+            if len(indexed) > 0 and indexed != columns:
+                # Indexed with other columns by an older version of the cache
+                for trigger in ('insert', 'delete', 'update'):
+                    self.__connection.execute(f"DROP TRIGGER IF EXISTS {table}_search_{trigger}")
+                self.__connection.execute(f"DROP TABLE {table}_search")
+                indexed = []
+            exists = len(indexed) > 0
+            try:
+                self.__connection.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_search USING fts5("
+                    f"{', '.join(columns)}, content={table}, prefix='1 2 3', "
+                    "tokenize='unicode61 remove_diacritics 2')")
+            except sqlite3.OperationalError:
+                # SQLite was built without FTS5, searches scan the tables instead
+                self.__full_text = False
+                return
+            new = ', '.join(f"NEW.{column}" for column in columns)
+            old = ', '.join(f"OLD.{column}" for column in columns)
+            self.__connection.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_search_insert
+                AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {table}_search (rowid, {', '.join(columns)}) VALUES (NEW.rowid, {new});
+                END''')
+            self.__connection.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_search_delete
+                AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {table}_search ({table}_search, rowid, {', '.join(columns)})
+                        VALUES ('delete', OLD.rowid, {old});
+                END''')
+            self.__connection.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_search_update
+                AFTER UPDATE OF {', '.join(columns)} ON {table} BEGIN
+                    INSERT INTO {table}_search ({table}_search, rowid, {', '.join(columns)})
+                        VALUES ('delete', OLD.rowid, {old});
+                    INSERT INTO {table}_search (rowid, {', '.join(columns)}) VALUES (NEW.rowid, {new});
+                END''')
+            if not exists:
+                # Index the rows cached before the index existed
+                self.__connection.execute(
+                    f"INSERT INTO {table}_search ({table}_search) VALUES ('rebuild')")
+        self.__connection.commit()
+
+    def __rebuild_search(self) -> None:
+        if not self.__full_text:
+            return
+        for table in Cache.__SEARCH_COLUMNS:
+            self.__connection.execute(
+                f"INSERT INTO {table}_search ({table}_search) VALUES ('rebuild')")
+
+    def search(self, table: str, text: str, limit: int = 10) -> list[str]:
+        '''
+        Returns the keys of the cached teams or events, by `table`, with a word
+        starting with each word of `text`, best matches first. Teams are also
+        found by the start of their number, alone or with other words.
+        '''
+        words = re.findall(r'\w+', text.lower())
+        if len(words) == 0 or limit <= 0:
+            return []
+        weights = Cache.__SEARCH_COLUMNS[table]
+        if table == 'teams' and len(words) == 1 and words[0].isdigit():
+            # Every key starting with the number sorts before the key with a
+            # colon in its place, the character after the digits
+            return [key for key, in self.__connection.execute(
+                'SELECT key FROM teams WHERE key >= ? AND key < ? ORDER BY team_number LIMIT ?',
+                (f"frc{words[0]}", f"frc{words[0]}:", limit))]
+        if not self.__full_text:
+            matches = ' OR '.join(f"{column} LIKE ?" for column in weights)
+            rows = self.__connection.execute(
+                f"SELECT key FROM {table} WHERE {' AND '.join(f'({matches})' for _ in words)} "
+                'ORDER BY key LIMIT ?',
+                [f"%{word}%" for word in words for _ in weights] + [limit])
+            return [key for key, in rows]
+        query = ' '.join(f'"{word}"*' for word in words)
+        rows = self.__connection.execute(
+            f"SELECT {table}.key FROM {table}_search JOIN {table} ON {table}.rowid = {table}_search.rowid "
+            f"WHERE {table}_search MATCH ? "
+            f"ORDER BY bm25({table}_search, {', '.join(map(str, weights.values()))}) LIMIT ?",
+            (query, limit))
+        return [key for key, in rows]
+
     def __init_team_index(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS team_index (
-            last_updated datetime,
-            teams text
+            last_updated int,
+            teams text,
+            last_accessed int
         )''')
+        self.__add_column('team_index', 'last_accessed', 'int')
         self.__connection.commit()
 
     def save_team_index(self, teams: list[str]) -> None:
         '''Save the team index'''
         self._delete_team_index()
-        self.__connection.execute('INSERT INTO team_index VALUES (?, ?)', (
-            datetime.utcnow().isoformat(),
-            json.dumps(teams)
+        self.__connection.execute('INSERT INTO team_index VALUES (?, ?, NULL)', (
+            int(time.time()),
+            serialization.dumps(teams)
         ))
         self.__connection.commit()
+        self.__written()
 
     def get_team_index(self, cache_expiry: int) -> list[str] | None:
         '''Get the team index'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM team_index')
+        cursor.execute('SELECT * FROM team_index WHERE last_updated >= ?', [oldest])
         result = cursor.fetchone()
         if result is None:
             return None
-        timestamp, teams = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_team_index()
+        timestamp, teams, _ = result
+        if self.__expired(timestamp, fresh, 'team_index', ()):
             return None
-        return json.loads(teams)
+        return [sys.intern(team) for team in serialization.loads(teams)]
 
     def _delete_team_index(self) -> None:
         self.__connection.execute('DELETE FROM team_index')
@@ -78,31 +488,85 @@ class Cache:
 
     def __init_teams(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS teams (
-            last_updated datetime,
+            last_updated int,
             key text, nickname text, name text,
             city text, state_prov text, country text,
             school_name text, website text,
-            rookie_year text, motto text
+            rookie_year text, motto text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('teams', 'last_modified', 'text')
+        self.__add_column('teams', 'last_accessed', 'int')
+        self.__add_team_number('teams', 'key')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS teams_state_prov ON teams (state_prov)')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS teams_country ON teams (country)')
         self.__connection.commit()
 
-    def save_team(self, team: Team) -> None:
-        '''Save a team'''
-        self._delete_team(team.key())
+    def __insert_team(self, team: Team, last_modified: str | None) -> None:
+        self.__connection.execute('DELETE FROM teams WHERE key = ?', [team.key()])
         location = team.location()
-        self.__connection.execute('INSERT INTO teams VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
-            datetime.utcnow().isoformat(),
+        self.__connection.execute('INSERT INTO teams VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)', (
+            int(time.time()),
             team.key(), team.nickname(), team.name(),
             location.city(), location.state_prov(), location.country(),
             team.school_name(), team.website(),
-            team.rookie_year(), team.motto()
+            team.rookie_year(), team.motto(),
+            last_modified
         ))
+
+    def save_team(self, team: Team,
+                  last_modified: str | None = None) -> None:
+        '''Save a team'''
+        self.__insert_team(team, last_modified)
         self.__connection.commit()
+        self.__written()
+
+    def save_teams(self, teams: list[Team],
+                   last_modified: str | None = None) -> None:
+        '''Save a number of teams in one transaction, with the Last-Modified header of their request'''
+        for team in teams:
+            self.__insert_team(team, last_modified)
+        self.__connection.commit()
+        for _ in teams:
+            self.__written()
+
+    def count_uncached_teams(self, cache_expiry: int) -> int:
+        '''Count the teams in the team index that aren't fresh'''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('''SELECT COUNT(*) FROM team_index AS i, json_each(i.teams) AS j
+            LEFT JOIN teams AS t ON t.key = j.value AND t.last_updated >= ?
+            WHERE t.key IS NULL''', [fresh])
+        count, = cursor.fetchone()
+        cursor.close()
+        return count
+
+    def get_teams_in(self, state_prov: str | None, country: str | None,
+                     cache_expiry: int) -> list[str]:
+        '''Get the fresh teams from a given state or province and country, either can be omitted'''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        where = ''
+        parameters: list = []
+        for column, value in (('state_prov', state_prov), ('country', country)):
+            if value is not None:
+                where += f" AND {column} = ?"
+                parameters.append(value)
+        cursor = self.__connection.cursor()
+        cursor.execute(f"SELECT key FROM teams WHERE last_updated >= ?{where} ORDER BY team_number",
+                       [fresh, *parameters])
+        teams = [sys.intern(row[0]) for row in cursor]
+        cursor.close()
+        return teams
 
     def get_team(self, team_key: str, cache_expiry: int) -> Team | None:
         '''Get a team'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM teams WHERE key = ?', [team_key])
+        cursor.execute('SELECT * FROM teams WHERE key = ? AND last_updated >= ?',
+                       [team_key, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
@@ -111,11 +575,10 @@ class Cache:
             timestamp, key, nickname, name,
             city, state_prov, country,
             school_name, website,
-            rookie_year, motto
+            rookie_year, motto,
+            _, _, _
         ) = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_team(team_key)
+        if self.__expired(timestamp, fresh, 'teams', (team_key,)):
             return None
         return Team(
             key, nickname, name,
@@ -131,34 +594,68 @@ class Cache:
 
     def __init_team_years(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS team_years (
-            last_updated datetime,
-            key text, years text
+            last_updated int,
+            key text, years text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('team_years', 'last_modified', 'text')
+        self.__add_column('team_years', 'last_accessed', 'int')
+        self.__add_team_number('team_years', 'key')
         self.__connection.commit()
 
-    def save_team_years(self, team_key: str, years: list[int]) -> None:
-        '''Save the years a team has participated in'''
-        self._delete_team_years(team_key)
-        self.__connection.execute('INSERT INTO team_years VALUES (?, ?, ?)', (
-            datetime.utcnow().isoformat(),
-            team_key, json.dumps(years)
+    def __insert_team_years(self, team_key: str, years: list[int],
+                            last_modified: str | None) -> None:
+        self.__connection.execute('DELETE FROM team_years WHERE key = ?', [team_key])
+        self.__connection.execute('INSERT INTO team_years VALUES (?, ?, ?, ?, NULL)', (
+            int(time.time()),
+            team_key, serialization.dumps(years),
+            last_modified
         ))
+
+    def save_team_years(self, team_key: str, years: list[int],
+                        last_modified: str | None = None) -> None:
+        '''Save the years a team has participated in'''
+        self.__insert_team_years(team_key, years, last_modified)
         self.__connection.commit()
+        self.__written()
+
+    def save_many_team_years(self, team_years: list[tuple[str, list[int], str | None]]) -> None:
+        '''Save the years each of a number of teams has participated in, in one transaction'''
+        for team_key, years, last_modified in team_years:
+            self.__insert_team_years(team_key, years, last_modified)
+        self.__connection.commit()
+        for _ in team_years:
+            self.__written()
+
+    def get_all_team_years(self, cache_expiry: int) -> dict[str, list[int]]:
+        '''
+        Get the years each team has participated in, for every team whose
+        years are fresh. Reading every row doesn't count as accessing them.
+        '''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT key, years FROM team_years WHERE last_updated >= ?', [fresh])
+        results = cursor.fetchall()
+        cursor.close()
+        # Decoding the rows as one array is much faster than one at a time
+        years = serialization.loads(f"[{','.join(row[1] for row in results)}]")
+        return dict(zip((row[0] for row in results), years))
 
     def get_team_years(self, team_key: str, cache_expiry: int) -> list[int] | None:
         '''Get the years a team has participated in'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM team_years WHERE key = ?', [team_key])
+        cursor.execute('SELECT * FROM team_years WHERE key = ? AND last_updated >= ?',
+                       [team_key, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
             return None
-        timestamp, _, years = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_team_years(team_key)
+        timestamp, _, years, _, _, _ = result
+        if self.__expired(timestamp, fresh, 'team_years', (team_key,)):
             return None
-        return json.loads(years)
+        return serialization.loads(years)
 
     def _delete_team_years(self, team_key: str) -> None:
         self.__connection.execute(
@@ -167,35 +664,80 @@ class Cache:
 
     def __init_team_year_events(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS team_year_events (
-            last_updated datetime,
-            key text, year int, events text
+            last_updated int,
+            key text, year int, events text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('team_year_events', 'last_modified', 'text')
+        self.__add_column('team_year_events', 'last_accessed', 'int')
+        self.__add_team_number('team_year_events', 'key')
         self.__connection.commit()
 
-    def save_team_year_events(self, team_key: str, year: int, events: list[str]) -> None:
+    def save_team_year_events(self, team_key: str, year: int, events: list[str],
+                              last_modified: str | None = None) -> None:
         '''Save the events a team has participated in for a given year'''
         self._delete_team_year_events(team_key, year)
-        self.__connection.execute('INSERT INTO team_year_events VALUES (?, ?, ?, ?)', (
-            datetime.utcnow().isoformat(),
-            team_key, year, json.dumps(events)
+        self.__connection.execute('INSERT INTO team_year_events VALUES (?, ?, ?, ?, ?, NULL)', (
+            int(time.time()),
+            team_key, year, serialization.dumps(events),
+            last_modified
         ))
         self.__connection.commit()
+        self.__written()
 
     def get_team_year_events(self, team_key: str, year: int, cache_expiry: int) -> list[str] | None:
         '''Get the events a team has participated in for a given year'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM team_year_events WHERE key = ? AND year = ?',
-                       [team_key, year])
+        cursor.execute('SELECT * FROM team_year_events WHERE key = ? AND year = ? '
+                       'AND last_updated >= ?', [team_key, year, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
             return None
-        timestamp, _, year, events = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_team_year_events(team_key, year)
+        timestamp, _, year, events, _, _, _ = result
+        if self.__expired(timestamp, fresh, 'team_year_events', (team_key, year)):
             return None
-        return json.loads(events)
+        return serialization.loads(events)
+
+    def get_uncached_year_events(self, year: int, cache_expiry: int) -> list[str]:
+        '''Get the events that fresh team events in a given year list but aren't fresh themselves'''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('''SELECT DISTINCT j.value FROM team_year_events AS t, json_each(t.events) AS j
+            LEFT JOIN events AS e ON e.key = j.value AND e.last_updated >= ?
+            WHERE t.year = ? AND t.last_updated >= ? AND e.key IS NULL''', [fresh, year, fresh])
+        events = [row[0] for row in cursor]
+        cursor.close()
+        return events
+
+    def get_team_event_profile(self, year: int, cache_expiry: int) -> StatsTable:
+        '''
+        Count the events of each type that each team with fresh events in a
+        given year participated in, as columns. Championships include
+        Einstein and district championships include their divisions, events
+        of other types or that aren't cached are counted as other.
+        '''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('''SELECT t.key, t.team_number,
+                IFNULL(SUM(e.type = 0), 0), IFNULL(SUM(e.type = 1), 0),
+                IFNULL(SUM(e.type IN (2, 5)), 0), IFNULL(SUM(e.type IN (3, 4)), 0),
+                SUM(j.value IS NOT NULL AND (e.type IS NULL OR e.type NOT IN (0, 1, 2, 3, 4, 5))),
+                COUNT(j.value)
+            FROM team_year_events AS t
+            LEFT JOIN json_each(t.events) AS j
+            LEFT JOIN events AS e ON e.key = j.value
+            WHERE t.year = ? AND t.last_updated >= ?
+            GROUP BY t.key
+            ORDER BY t.team_number''', [year, fresh])
+        profile = StatsTable.from_rows(
+            ['team_key', 'team_number', 'regional', 'district', 'district_championship',
+             'championship', 'other', 'events'],
+            [False] + [True] * 7, cursor)
+        cursor.close()
+        return profile
 
     def _delete_team_year_events(self, team_key: str, year: int) -> None:
         self.__connection.execute('DELETE FROM team_year_events WHERE key = ? AND year = ?',
@@ -204,34 +746,41 @@ class Cache:
 
     def __init_year_events(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS year_events (
-            last_updated datetime,
-            year int, events text
+            last_updated int,
+            year int, events text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('year_events', 'last_modified', 'text')
+        self.__add_column('year_events', 'last_accessed', 'int')
         self.__connection.commit()
 
-    def save_year_events(self, year: int, events: list[str]) -> None:
+    def save_year_events(self, year: int, events: list[str],
+                         last_modified: str | None = None) -> None:
         '''Save the events for a given year'''
         self._delete_year_events(year)
-        self.__connection.execute('INSERT INTO year_events VALUES (?, ?, ?)', (
-            datetime.utcnow().isoformat(),
-            year, json.dumps(events)
+        self.__connection.execute('INSERT INTO year_events VALUES (?, ?, ?, ?, NULL)', (
+            int(time.time()),
+            year, serialization.dumps(events),
+            last_modified
         ))
         self.__connection.commit()
+        self.__written()
 
     def get_year_events(self, year: int, cache_expiry: int) -> list[str] | None:
         '''Get the events for a given year'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM year_events WHERE year = ?', [year])
+        cursor.execute('SELECT * FROM year_events WHERE year = ? AND last_updated >= ?',
+                       [year, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
             return None
-        timestamp, year, events = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_year_events(year)
+        timestamp, year, events, _, _ = result
+        if self.__expired(timestamp, fresh, 'year_events', (year,)):
             return None
-        return json.loads(events)
+        return serialization.loads(events)
 
     def _delete_year_events(self, year: int) -> None:
         self.__connection.execute(
@@ -240,37 +789,45 @@ class Cache:
 
     def __init_events(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS events (
-            last_updated datetime,
+            last_updated int,
             key text, year int, name text,
             city text, state_prov text, country text,
             type int,
-            start_date datetime, end_date datetime,
+            start_date int, end_date int,
             event_district text,
             short_name text, week int,
             address text, postal_code text,
             place_id text, lat float, lng float,
             location_name text, timezone text,
             website text, fisrt_event_id text, first_event_code text,
-            webcasts text, divisions text, parent_event_key text, playoff_type text
+            webcasts text, divisions text, parent_event_key text, playoff_type text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('events', 'last_modified', 'text')
+        self.__add_column('events', 'last_accessed', 'int')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS events_year ON events (year)')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS events_district ON events (event_district, year)')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS events_week ON events (week, year)')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS events_type ON events (type, year)')
         self.__connection.commit()
 
-    def save_event(self, event: Event) -> None:
-        '''Save an event'''
-        self._delete_event(event.key())
+    def __insert_event(self, event: Event, last_modified: str | None) -> None:
+        self.__connection.execute('DELETE FROM events WHERE key = ?', [event.key()])
         location = event.location()
         start, end = event.dates()
-        webcasts = []
-        for webcast in event.webcasts():
-            webcasts.append(webcast.to_json())
         precise_location = event.precise_location()
         self.__connection.execute('INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, '
-                                  '?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
-                                      datetime.utcnow().isoformat(),
+                                  '?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)', (
+                                      int(time.time()),
                                       event.key(), Event.event_key_to_year(event.key()), event.name(),
                                       location.city(), location.state_prov(), location.country(),
                                       event.event_type(),
-                                      start.isoformat(), end.isoformat(),
+                                      calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple()),
                                       event.district_key(),
                                       event.short_name(), event.week(),
                                       precise_location.address(), precise_location.postal_code(),
@@ -278,22 +835,44 @@ class Cache:
                                       precise_location.latitude(), precise_location.longitude(),
                                       event.location_name(), event.timezone(),
                                       event.website(), event.first_event_id(), event.first_event_code(),
-                                      json.dumps(webcasts), json.dumps(
-                                          event.divisions()),
-                                      event.parent_event_key(), event.playoff_type()
+                                      serialization.dumps([webcast.to_dict() for webcast in event.webcasts()]),
+                                      serialization.dumps(event.divisions()),
+                                      event.parent_event_key(), event.playoff_type(),
+                                      last_modified
                                   ))
+
+    def save_event(self, event: Event,
+                   last_modified: str | None = None) -> None:
+        '''Save an event'''
+        self.__insert_event(event, last_modified)
+        self.__connection.commit()
+        self.__written()
+
+    def save_events(self, events: list[Event],
+                    last_modified: str | None = None) -> None:
+        '''Save a number of events in one transaction, with the Last-Modified header of their request'''
+        for event in events:
+            self.__insert_event(event, last_modified)
         self.__connection.commit()
+        for _ in events:
+            self.__written()
 
     def get_event(self, event_key: str, cache_expiry: int) -> Event | None:
         '''Get an event'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM events WHERE key = ?', [event_key])
+        cursor.execute('SELECT * FROM events WHERE key = ? AND last_updated >= ?',
+                       [event_key, oldest])
         result = cursor.fetchone()
         cursor.close()
-        if result is None:
+        if result is None or self.__expired(result[0], fresh, 'events', (event_key,)):
             return None
+        return Cache.__event_from_row(result)
+
+    @staticmethod
+    def __event_from_row(row: tuple) -> Event:
         (
-            timestamp,
+            _,
             key, _, name,
             city, state_prov, country,
             event_type,
@@ -304,25 +883,16 @@ class Cache:
             place_id, lat, lng,
             location_name, timezone,
             website, first_event_id, first_event_code,
-            raw_webcasts, divisions, parent_event_key, playoff_type
-        ) = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_event(event_key)
-            return None
-        start = datetime.fromisoformat(start)
-        end = datetime.fromisoformat(end)
+            raw_webcasts, divisions, parent_event_key, playoff_type,
+            _, _
+        ) = row
         location = Location(city, state_prov, country)
         precise_location = PreciseLocation(
             location, lat, lng,
             address, postal_code, place_id
         )
-        raw_webcasts = json.loads(raw_webcasts)
-        webcasts = []
-        for webcast in raw_webcasts:
-            webcast = json.loads(webcast)
-            webcasts.append(Webcast(webcast['type'], webcast['channel'],
-                                    webcast['date'], webcast['file']))
+        if playoff_type is not None:
+            playoff_type = int(playoff_type)  # The column was declared as text
         return Event(
             key, name,
             location,
@@ -333,9 +903,82 @@ class Cache:
             precise_location,
             location_name, timezone,
             website, first_event_id, first_event_code,
-            webcasts, divisions, parent_event_key, playoff_type
+            raw_webcasts, divisions, parent_event_key, playoff_type
         )
 
+    def count_uncached_events(self, year: int, cache_expiry: int) -> int | None:
+        '''
+        Count the events in a given year that aren't fresh, or None if the
+        list of the year's events isn't fresh
+        '''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM year_events WHERE year = ? AND last_updated >= ?',
+                       [year, fresh])
+        listed, = cursor.fetchone()
+        if listed == 0:
+            cursor.close()
+            return None
+        cursor.execute('''SELECT COUNT(*) FROM year_events AS y, json_each(y.events) AS j
+            LEFT JOIN events AS e ON e.key = j.value AND e.last_updated >= ?
+            WHERE y.year = ? AND e.key IS NULL''', [fresh, year])
+        count, = cursor.fetchone()
+        cursor.close()
+        return count
+
+    def touch_year_events(self, year: int) -> None:
+        '''Renew the list of a year's events and the listed events, known to be unchanged'''
+        now = int(time.time())
+        self.__connection.execute('UPDATE year_events SET last_updated = ? WHERE year = ?',
+                                  [now, year])
+        self.__connection.execute('''UPDATE events SET last_updated = ? WHERE key IN (
+            SELECT j.value FROM year_events AS y, json_each(y.events) AS j WHERE y.year = ?)''',
+                                  [now, year])
+        self.__connection.commit()
+
+    def get_events_where(self, year: int, district: str | None, week: int | None,
+                         event_type: int | None, cache_expiry: int) -> list[str]:
+        '''Get the fresh events in a given year matching the given district, week and type'''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        where = ''
+        parameters: list = []
+        for column, value in (('event_district', district), ('week', week), ('type', event_type)):
+            if value is not None:
+                where += f" AND {column} = ?"
+                parameters.append(value)
+        cursor = self.__connection.cursor()
+        cursor.execute(f"SELECT key FROM events WHERE year = ? AND last_updated >= ?{where} "
+                       f"ORDER BY start_date, key", [year, fresh, *parameters])
+        events = [row[0] for row in cursor]
+        cursor.close()
+        return events
+
+    def iter_events(self, year: int, cache_expiry: int) -> Iterator[Event]:
+        '''
+        Stream the fresh events in a given year in order of their start, each
+        row is read from the cursor as it's consumed
+        '''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT * FROM events WHERE year = ? AND last_updated >= ? '
+                       'ORDER BY start_date, key', [year, fresh])
+        try:
+            for row in cursor:
+                yield Cache.__event_from_row(row)
+        finally:
+            cursor.close()
+
+    def get_event_dates(self, event_key: str) -> tuple[datetime, datetime] | None:
+        '''Get the dates of an event, regardless of when it was cached'''
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT start_date, end_date FROM events WHERE key = ?', [event_key])
+        result = cursor.fetchone()
+        cursor.close()
+        if result is None:
+            return None
+        start, end = result
+        return datetime.utcfromtimestamp(start), datetime.utcfromtimestamp(end)
+
     def _delete_event(self, event_key: str) -> None:
         self.__connection.execute(
             'DELETE FROM events WHERE key = ?', [event_key])
@@ -343,35 +986,42 @@ class Cache:
 
     def __init_event_teams(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS event_teams (
-            last_updated datetime,
-            event text, teams text
+            last_updated int,
+            event text, teams text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('event_teams', 'last_modified', 'text')
+        self.__add_column('event_teams', 'last_accessed', 'int')
         self.__connection.commit()
 
-    def save_event_teams(self, event_key: str, teams: list[str]) -> None:
+    def save_event_teams(self, event_key: str, teams: list[str],
+                         last_modified: str | None = None) -> None:
         '''Save the teams for an event'''
         self._delete_event_teams(event_key)
-        self.__connection.execute('INSERT INTO event_teams VALUES (?, ?, ?)', (
-            datetime.utcnow().isoformat(),
-            event_key, json.dumps(teams)
+        self.__connection.execute('INSERT INTO event_teams VALUES (?, ?, ?, ?, NULL)', (
+            int(time.time()),
+            event_key, serialization.dumps(teams),
+            last_modified
         ))
         self.__connection.commit()
+        self.__written()
 
     def get_event_teams(self, event_key: str, cache_expiry: int) -> list[str] | None:
         '''Get the teams for an event'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
         cursor.execute(
-            'SELECT * FROM event_teams WHERE event = ?', [event_key])
+            'SELECT * FROM event_teams WHERE event = ? AND last_updated >= ?',
+            [event_key, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
             return None
-        timestamp, _, teams = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_event_teams(event_key)
+        timestamp, _, teams, _, _ = result
+        if self.__expired(timestamp, fresh, 'event_teams', (event_key,)):
             return None
-        return json.loads(teams)
+        return [sys.intern(team) for team in serialization.loads(teams)]
 
     def _delete_event_teams(self, event_key: str) -> None:
         self.__connection.execute(
@@ -380,35 +1030,72 @@ class Cache:
 
     def __init_event_matches(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS event_matches (
-            last_updated datetime,
-            event text, matches text
+            last_updated int,
+            event text, matches text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('event_matches', 'last_modified', 'text')
+        self.__add_column('event_matches', 'last_accessed', 'int')
         self.__connection.commit()
 
-    def save_event_matches(self, event_key: str, matches: list[str]) -> None:
+    def save_event_matches(self, event_key: str, matches: list[str],
+                           last_modified: str | None = None) -> None:
         '''Save the matches for an event'''
         self._delete_event_matches(event_key)
-        self.__connection.execute('INSERT INTO event_matches VALUES (?, ?, ?)', (
-            datetime.utcnow().isoformat(),
-            event_key, json.dumps(matches)
+        self.__connection.execute('INSERT INTO event_matches VALUES (?, ?, ?, ?, NULL)', (
+            int(time.time()),
+            event_key, serialization.dumps(matches),
+            last_modified
         ))
         self.__connection.commit()
+        self.__written()
 
     def get_event_matches(self, event_key: str, cache_expiry: int) -> list[str] | None:
         '''Get the matches for an event'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
         cursor.execute(
-            'SELECT * FROM event_matches WHERE event = ?', [event_key])
+            'SELECT * FROM event_matches WHERE event = ? AND last_updated >= ?',
+            [event_key, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
             return None
-        timestamp, _, matches = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_event_matches(event_key)
+        timestamp, _, matches, _, _ = result
+        if self.__expired(timestamp, fresh, 'event_matches', (event_key,)):
+            return None
+        return serialization.loads(matches)
+
+    def count_uncached_matches(self, event_key: str, cache_expiry: int) -> int | None:
+        '''
+        Count the matches in a given event that aren't fresh, or None if the
+        list of the event's matches isn't fresh
+        '''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM event_matches WHERE event = ? AND last_updated >= ?',
+                       [event_key, fresh])
+        listed, = cursor.fetchone()
+        if listed == 0:
+            cursor.close()
             return None
-        return json.loads(matches)
+        cursor.execute('''SELECT COUNT(*) FROM event_matches AS l, json_each(l.matches) AS j
+            LEFT JOIN matches AS m ON m.key = j.value AND m.last_updated >= ?
+            WHERE l.event = ? AND m.key IS NULL''', [fresh, event_key])
+        count, = cursor.fetchone()
+        cursor.close()
+        return count
+
+    def touch_event_matches(self, event_key: str) -> None:
+        '''Renew the list of an event's matches and the listed matches, known to be unchanged'''
+        now = int(time.time())
+        self.__connection.execute('UPDATE event_matches SET last_updated = ? WHERE event = ?',
+                                  [now, event_key])
+        self.__connection.execute('''UPDATE matches SET last_updated = ? WHERE key IN (
+            SELECT j.value FROM event_matches AS l, json_each(l.matches) AS j WHERE l.event = ?)''',
+                                  [now, event_key])
+        self.__connection.commit()
 
     def _delete_event_matches(self, event_key: str) -> None:
         self.__connection.execute(
@@ -417,36 +1104,65 @@ class Cache:
 
     def __init_team_event_matches(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS team_event_matches (
-            last_updated datetime,
-            team text, event text, matches text
+            last_updated int,
+            team text, event text, matches text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('team_event_matches', 'last_modified', 'text')
+        self.__add_column('team_event_matches', 'last_accessed', 'int')
         self.__connection.commit()
 
-    def save_team_event_matches(self, team_key: str, event_key: str, matches: list[str]) -> None:
+    def save_team_event_matches(self, team_key: str, event_key: str, matches: list[str],
+                                last_modified: str | None = None) -> None:
         '''Save the matches for a team at an event'''
         self._delete_team_event_matches(team_key, event_key)
-        self.__connection.execute('INSERT INTO team_event_matches VALUES (?, ?, ?, ?)', (
-            datetime.utcnow().isoformat(),
-            team_key, event_key, json.dumps(matches)
+        self.__connection.execute('INSERT INTO team_event_matches VALUES (?, ?, ?, ?, ?, NULL)', (
+            int(time.time()),
+            team_key, event_key, serialization.dumps(matches),
+            last_modified
         ))
         self.__connection.commit()
+        self.__written()
 
     def get_team_event_matches(self, team_key: str, event_key: str,
                                cache_expiry: int) -> list[str] | None:
         '''Get the matches for a team at an event'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM team_event_matches WHERE team = ? AND event = ?',
-                       [team_key, event_key])
+        cursor.execute('SELECT * FROM team_event_matches WHERE team = ? AND event = ? '
+                       'AND last_updated >= ?', [team_key, event_key, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
             return None
-        timestamp, _, _, matches = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_team_event_matches(team_key, event_key)
+        timestamp, _, _, matches, _, _ = result
+        if self.__expired(timestamp, fresh, 'team_event_matches', (team_key, event_key)):
             return None
-        return json.loads(matches)
+        return serialization.loads(matches)
+
+    def get_event_team_matches(self, team_key: str, event_key: str,
+                               cache_expiry: int) -> list[str] | None:
+        '''
+        Get the matches for a team at an event from the event's cached matches,
+        only when the event's match list and every match in it are cached
+        '''
+        matches = self.get_event_matches(event_key, cache_expiry)
+        if matches is None:
+            return None
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM matches WHERE key IN (SELECT value FROM json_each(?)) '
+                       'AND last_updated >= ?', [serialization.dumps(matches), fresh])
+        count, = cursor.fetchone()
+        if count < len(matches):
+            cursor.close()
+            return None
+        cursor.execute('SELECT match_key FROM match_teams WHERE event = ? AND team_key = ?',
+                       [event_key, team_key])
+        played = {match_key for match_key, in cursor.fetchall()}
+        cursor.close()
+        return [match_key for match_key in matches if match_key in played]
 
     def _delete_team_event_matches(self, team_key: str, event_key: str) -> None:
         self.__connection.execute('DELETE FROM team_event_matches WHERE team = ? AND event = ?',
@@ -455,83 +1171,123 @@ class Cache:
 
     def __init_match(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS matches (
-            last_updated datetime,
+            last_updated int,
             key text, year int, event text,
             level text, set_number int, match_number int,
             red_score int, blue_score int,
             red_teams text, blue_teams text,
             winner text,
-            scheduled_time datetime, predicted_time datetime,
-            actual_time datetime, result_time datetime,
-            videos text
+            scheduled_time int, predicted_time int,
+            actual_time int, result_time int,
+            videos text,
+            last_modified text,
+            last_accessed int
         )''')
+        self.__add_column('matches', 'last_modified', 'text')
+        self.__add_column('matches', 'last_accessed', 'int')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS matches_event ON matches (event)')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS matches_year ON matches (year)')
         self.__connection.commit()
 
-    def save_match(self, match: Match) -> None:
-        '''Save a match'''
-        self._delete_match(match.key())
-        videos = []
-        for video in match.videos():
-            videos.append(video.to_json())
+    def __insert_match(self, match: Match, last_modified: str | None) -> None:
+        self.__connection.execute(
+            'DELETE FROM matches WHERE key = ?', [match.key()])
         self.__connection.execute('INSERT INTO matches VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '
-                                  '?, ?, ?, ?, ?, ?, ?, ?)', (
-                                      datetime.utcnow().isoformat(),
+                                  '?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)', (
+                                      int(time.time()),
                                       match.key(),
                                       Match.match_key_to_year(match.key()),
                                       Match.match_key_to_event(match.key()),
                                       match.level(), match.set_number(), match.match_number(),
                                       match.red_score(), match.blue_score(),
-                                      match.red_teams().to_json(), match.blue_teams().to_json(),
+                                      serialization.dumps(match.red_teams().to_dict()),
+                                      serialization.dumps(match.blue_teams().to_dict()),
                                       match.winner(),
-                                      match.schedule_time().isoformat(), match.predicted_time().isoformat(),
-                                      match.actual_time().isoformat(), match.result_time().isoformat(),
-                                      json.dumps(videos)
+                                      Cache.__epoch(match.schedule_time()), Cache.__epoch(match.predicted_time()),
+                                      Cache.__epoch(match.actual_time()), Cache.__epoch(match.result_time()),
+                                      serialization.dumps([video.to_dict() for video in match.videos()]),
+                                      last_modified
                                   ))
+        event = Match.match_key_to_event(match.key())
+        year = Match.match_key_to_year(match.key())
+        participants = []
+        for alliance, teams in (('red', match.red_teams()), ('blue', match.blue_teams())):
+            for station, team in enumerate(teams.teams(), 1):
+                participants.append((
+                    match.key(), event, year, team, alliance, station,
+                    team in teams.disqualified(), team in teams.surrogate()
+                ))
+        self.__connection.executemany('INSERT INTO match_teams VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                      participants)
+        if match.score_breakdown() is not None:
+            self.__insert_score_breakdown(match.key(), year, match.score_breakdown())
+
+    def save_match(self, match: Match,
+                   last_modified: str | None = None) -> None:
+        '''Save a match'''
+        self.__insert_match(match, last_modified)
         self.__connection.commit()
+        self.__written()
+
+    def save_matches(self, matches: list[Match],
+                     last_modified: str | None = None) -> None:
+        '''Save several matches in a single transaction, with the Last-Modified header of their request'''
+        for match in matches:
+            self.__insert_match(match, last_modified)
+        self.__connection.commit()
+        for _ in matches:
+            self.__written()
 
     def get_match(self, match_key: str, cache_expiry: int) -> Match | None:
         '''Get a match'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM matches WHERE key = ?', [match_key])
+        cursor.execute('SELECT * FROM matches WHERE key = ? AND last_updated >= ?',
+                       [match_key, oldest])
         result = cursor.fetchone()
         cursor.close()
-        if result is None:
+        if result is None or self.__expired(result[0], fresh, 'matches', (match_key,)):
             return None
+        breakdowns = self.__score_breakdowns(result[2], 'match_key = ?', [match_key])
+        return self.__match_from_row(result, breakdowns.get(match_key))
+
+    def iter_event_matches(self, event_key: str, cache_expiry: int) -> Iterator[Match]:
+        '''
+        Stream the fresh matches in a given event in order of level and
+        number, each row is read from the cursor as it's consumed
+        '''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        # The breakdowns of the whole event are read up front in one query,
+        # the match keys of an event all start with the event key and '_'
+        breakdowns = self.__score_breakdowns(Event.event_key_to_year(event_key),
+                                             'match_key > ? AND match_key < ?',
+                                             [f"{event_key}_", f"{event_key}`"])
+        cursor = self.__connection.cursor()
+        cursor.execute('''SELECT * FROM matches WHERE event = ? AND last_updated >= ?
+            ORDER BY CASE level WHEN 'qm' THEN 0 WHEN 'ef' THEN 1 WHEN 'qf' THEN 2
+                WHEN 'sf' THEN 3 WHEN 'f' THEN 4 ELSE 5 END, set_number, match_number, key''',
+                       [event_key, fresh])
+        try:
+            for row in cursor:
+                yield self.__match_from_row(row, breakdowns.get(row[1]))
+        finally:
+            cursor.close()
+
+    def __match_from_row(self, row: tuple, score_breakdown: dict[str, dict] | None) -> Match:
         (
-            timestamp, key, _, _, level, set_number, match_number, red_score, blue_score,
+            _, key, _, _, level, set_number, match_number, red_score, blue_score,
             red_teams, blue_teams, winner,
             scheduled_time, predicted_time, actual_time, result_time,
-            raw_videos
-        ) = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_match(match_key)
-            return None
-        red_teams = json.loads(red_teams)
-        red_teams = MatchAlliance(
-            red_teams['teams'], red_teams['dq'], red_teams['surrogate'])
-        blue_teams = json.loads(blue_teams)
-        blue_teams = MatchAlliance(
-            blue_teams['teams'], blue_teams['dq'], blue_teams['surrogate'])
-        raw_videos = json.loads(raw_videos)
-        videos = []
-        for video in raw_videos:
-            video = json.loads(video)
-            videos.append(MatchVideo(video['key'], video['type']))
-        if scheduled_time is not None:
-            scheduled_time = datetime.fromisoformat(scheduled_time)
-        if predicted_time is not None:
-            predicted_time = datetime.fromisoformat(predicted_time)
-        if actual_time is not None:
-            actual_time = datetime.fromisoformat(actual_time)
-        if result_time is not None:
-            result_time = datetime.fromisoformat(result_time)
+            raw_videos, _, _
+        ) = row
         return Match(key, level, set_number, match_number,
                      red_score, blue_score,
                      red_teams, blue_teams,
                      winner,
                      scheduled_time, predicted_time, actual_time, result_time,
-                     videos
+                     raw_videos, score_breakdown
                      )
 
     def _delete_match(self, match_key: str) -> None:
@@ -539,9 +1295,246 @@ class Cache:
             'DELETE FROM matches WHERE key = ?', [match_key])
         self.__connection.commit()
 
+    def __init_match_teams(self) -> None:
+        # One row per team per match, kept in step with the matches table
+        self.__connection.execute('''CREATE TABLE IF NOT EXISTS match_teams (
+            match_key text, event text, year int,
+            team_key text, alliance text, station int,
+            dq int, surrogate int
+        )''')
+        self.__add_team_number('match_teams', 'team_key')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS match_teams_match ON match_teams (match_key)')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS match_teams_team ON match_teams (team_key, year)')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS match_teams_event ON match_teams (event, team_key)')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS match_teams_number ON match_teams (team_number, year)')
+        # Matches are also removed by sweeping and eviction
+        self.__connection.execute('''CREATE TRIGGER IF NOT EXISTS matches_delete
+            AFTER DELETE ON matches BEGIN
+                DELETE FROM match_teams WHERE match_key = OLD.key;
+            END''')
+        self.__connection.commit()
+
+    def __breakdowns(self, year: int, create: bool = False) -> dict[str, str]:
+        '''
+        Returns the declared type of each column of a season's score breakdown
+        table, optionally creating the table. Every game has its own fields, so
+        each season has its own table and columns are added as fields appear.
+        '''
+        columns = self.__breakdown_columns.get(year)
+        if columns is not None:
+            return columns
+        table = f"score_breakdowns_{year}"
+        if create:
+            self.__connection.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+                match_key text, alliance text
+            )''')
+            self.__connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_match ON {table} (match_key)")
+            self.__connection.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_delete
+                AFTER DELETE ON matches WHEN OLD.year = {year} BEGIN
+                    DELETE FROM {table} WHERE match_key = OLD.key;
+                END''')
+        columns = {row[1]: row[2] for row in self.__connection.execute(f"PRAGMA table_info({table})")}
+        if len(columns) > 0:
+            # A missing table isn't remembered, another connection may create it
+            del columns['match_key'], columns['alliance']
+            self.__breakdown_columns[year] = columns
+        return columns
+
+    def __insert_score_breakdown(self, match_key: str, year: int, breakdown: dict[str, dict]) -> None:
+        # The previous breakdown was deleted with the match by the table's trigger
+        table = f"score_breakdowns_{year}"
+        columns = self.__breakdowns(year, create=True)
+        for alliance, fields in breakdown.items():
+            values = {}
+            for name, value in fields.items():
+                if value is None:
+                    continue
+                if isinstance(value, bool):
+                    column_type = 'bool'
+                elif isinstance(value, int):
+                    column_type = 'int'
+                elif isinstance(value, float):
+                    column_type = 'float'
+                elif isinstance(value, str):
+                    column_type = 'text'
+                else:
+                    column_type = 'json text'
+                    value = serialization.dumps(value)
+                if name not in columns:
+                    try:
+                        self.__connection.execute(
+                            f'ALTER TABLE {table} ADD COLUMN "{name}" {column_type}')
+                    except sqlite3.OperationalError:
+                        pass  # Added by another connection since the columns were read
+                    columns[name] = column_type
+                values[name] = value
+            names = ''.join(f', "{name}"' for name in values)
+            self.__connection.execute(
+                f"INSERT INTO {table} (match_key, alliance{names}) "
+                f"VALUES (?, ?{', ?' * len(values)})", [match_key, alliance, *values.values()])
+
+    def __score_breakdowns(self, year: int, where: str, parameters: list) -> dict[str, dict[str, dict]]:
+        '''Returns the score breakdowns of the matches of a season matching a condition, by match key'''
+        columns = self.__breakdowns(year)
+        if len(columns) == 0:
+            return {}
+        cursor = self.__connection.cursor()
+        cursor.execute(f"SELECT * FROM score_breakdowns_{year} WHERE {where}", parameters)
+        names = [description[0] for description in cursor.description[2:]]
+        if any(name not in columns for name in names):
+            # Columns were added by another connection since they were read
+            del self.__breakdown_columns[year]
+            columns = self.__breakdowns(year)
+        breakdowns = {}
+        for match_key, alliance, *row in cursor:
+            fields = {}
+            for name, value in zip(names, row):
+                if value is None:
+                    continue  # The field wasn't in this match's breakdown
+                if columns.get(name) == 'bool':
+                    value = bool(value)
+                elif columns.get(name) == 'json text':
+                    value = serialization.loads(value)
+                fields[name] = value
+            breakdowns.setdefault(match_key, {})[alliance] = fields
+        cursor.close()
+        return breakdowns
+
+    def get_score_breakdowns(self, year: int) -> StatsTable | None:
+        '''
+        Get the score breakdowns of every cached match in a year as columns,
+        with a row for each alliance of each match
+        '''
+        columns = self.__breakdowns(year)
+        if len(columns) == 0:
+            return None
+        cursor = self.__connection.cursor()
+        cursor.execute(f"SELECT * FROM score_breakdowns_{year} ORDER BY match_key, alliance")
+        names = [description[0] for description in cursor.description]
+        numeric = [columns.get(name) in ('bool', 'int', 'float') for name in names]
+        stats = StatsTable.from_rows(names, numeric, cursor)
+        cursor.close()
+        return stats
+
+    def get_match_results(self, after: tuple | None = None, year: int | None = None,
+                          event: str | None = None, until: tuple | None = None,
+                          updated_since: int | None = None) -> list[tuple]:
+        '''
+        Get the result of every played match in the cache in chronological
+        order, optionally only those ordered after the position `after` or up
+        to the position `until`, those of a year or event, or those cached
+        since the epoch time `updated_since`.
+
+        Rows are the match's position, followed by the red and blue scores and
+        the team numbers of the red and blue alliances, with 0 for an empty
+        station. A position is (year, time, event, level, set number, match
+        number, key), where the time is the match's start, or its event's
+        start when TBA doesn't have match times.
+        '''
+        stations = ', '.join(
+            f"IFNULL(MAX(CASE WHEN t.alliance = '{alliance}' AND t.station = {station} "
+            f"THEN t.team_number END), 0)"
+            for alliance in ('red', 'blue') for station in (1, 2, 3))
+        bounds = []
+        if after is not None:
+            bounds.append('(year, time, event, level, set_number, match_number, key) > (?, ?, ?, ?, ?, ?, ?)')
+        if until is not None:
+            bounds.append('(year, time, event, level, set_number, match_number, key) <= (?, ?, ?, ?, ?, ?, ?)')
+        where = f"WHERE {' AND '.join(bounds)}" if len(bounds) > 0 else ''
+        filters = ''
+        parameters = []
+        if year is not None:
+            filters += ' AND m.year = ?'
+            parameters.append(year)
+        if event is not None:
+            filters += ' AND m.event = ?'
+            parameters.append(event)
+        if updated_since is not None:
+            filters += ' AND m.last_updated >= ?'
+            parameters.append(updated_since)
+        if after is not None:
+            parameters += list(after)
+        if until is not None:
+            parameters += list(until)
+        cursor = self.__connection.cursor()
+        cursor.execute(f'''SELECT * FROM (
+            SELECT m.year AS year,
+                IFNULL(IFNULL(m.actual_time, m.scheduled_time), IFNULL(e.start_date, 0)) AS time,
+                m.event AS event,
+                CASE m.level WHEN 'qm' THEN 0 WHEN 'ef' THEN 1 WHEN 'qf' THEN 2
+                    WHEN 'sf' THEN 3 WHEN 'f' THEN 4 ELSE 5 END AS level,
+                m.set_number AS set_number, m.match_number AS match_number, m.key AS key,
+                m.red_score, m.blue_score, {stations}
+            FROM matches AS m
+            JOIN match_teams AS t ON t.match_key = m.key
+            LEFT JOIN events AS e ON e.key = m.event
+            WHERE m.red_score >= 0 AND m.blue_score >= 0{filters}
+            GROUP BY m.key
+        ) {where}
+        ORDER BY year, time, event, level, set_number, match_number, key''', parameters)
+        results = cursor.fetchall()
+        cursor.close()
+        return results
+
+    def __init_team_year_matches(self) -> None:
+        self.__connection.execute('''CREATE TABLE IF NOT EXISTS team_year_matches (
+            last_updated int,
+            team text, year int, count int,
+            last_modified text,
+            last_accessed int
+        )''')
+        self.__connection.commit()
+
+    def save_team_year_matches(self, team_key: str, year: int, count: int,
+                               last_modified: str | None = None) -> None:
+        '''
+        Record that all `count` matches a team played in a year have been
+        saved, so they can be listed from the match participants
+        '''
+        self._delete_team_year_matches(team_key, year)
+        self.__connection.execute('INSERT INTO team_year_matches VALUES (?, ?, ?, ?, ?, NULL)', (
+            int(time.time()),
+            team_key, year, count,
+            last_modified
+        ))
+        self.__connection.commit()
+        self.__written()
+
+    def get_team_year_matches(self, team_key: str, year: int,
+                              cache_expiry: int) -> list[str] | None:
+        '''Get the matches a team played in a year'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT * FROM team_year_matches WHERE team = ? AND year = ? '
+                       'AND last_updated >= ?', [team_key, year, oldest])
+        result = cursor.fetchone()
+        if result is None:
+            cursor.close()
+            return None
+        timestamp, _, _, count, _, _ = result
+        cursor.execute('SELECT match_key FROM match_teams WHERE team_key = ? AND year = ? '
+                       'ORDER BY match_key', [team_key, year])
+        matches = [match_key for match_key, in cursor.fetchall()]
+        cursor.close()
+        if len(matches) < count:
+            return None  # Some of the matches have since been removed
+        if self.__expired(timestamp, fresh, 'team_year_matches', (team_key, year)):
+            return None
+        return matches
+
+    def _delete_team_year_matches(self, team_key: str, year: int) -> None:
+        self.__connection.execute('DELETE FROM team_year_matches WHERE team = ? AND year = ?',
+                                  [team_key, year])
+        self.__connection.commit()
+
     def __init_team_year_stats(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS team_year_stats (
-            last_updated datetime,
+            last_updated int,
             team_key text, year int,
             epa_start float, epa_pre_champs float, epa_end float, epa_mean float, epa_max float, epa_diff float,
             auto_epa_start float, auto_epa_pre_champs float, auto_epa_end float, auto_epa_mean float, auto_epa_max float,
@@ -551,13 +1544,16 @@ class Cache:
             rp_2_epa_start float, rp_2_epa_pre_champs float, rp_2_epa_end float, rp_2_epa_mean float, rp_2_epa_max float,
             norm_epa_end float,
             wins int, losses int, ties int, count int, winrate float,
-            epa_rank float, epa_percent float
+            epa_rank float, epa_percent float,
+            last_accessed int
         )''')
+        self.__add_column('team_year_stats', 'last_accessed', 'int')
+        self.__add_team_number('team_year_stats', 'team_key')
         self.__connection.commit()
 
-    def save_team_year_stats(self, team_key: str, year: int, stats: TeamYearStats) -> None:
-        '''Save the stats for a team in a given year'''
-        self._delete_team_year_stats(team_key, year)
+    def __insert_team_year_stats(self, team_key: str, year: int, stats: TeamYearStats) -> None:
+        self.__connection.execute('DELETE FROM team_year_stats WHERE team_key = ? AND year = ?',
+                                  [team_key, year])
         self.__connection.execute('INSERT INTO team_year_stats VALUES ('
                                   '?, '
                                   '?, ?, '
@@ -569,8 +1565,8 @@ class Cache:
                                   '?, ?, ?, ?, ?, '
                                   '?, '
                                   '?, ?, ?, ?, ?, '
-                                  '?, ?)', (
-                                      datetime.utcnow().isoformat(),
+                                  '?, ?, NULL)', (
+                                      int(time.time()),
                                       team_key, year,
                                       stats.epa_start(), stats.epa_pre_champs(), stats.epa_end(
                                       ), stats.epa_mean(), stats.epa_max(), stats.epa_diff(),
@@ -588,20 +1584,30 @@ class Cache:
                                       stats.wins(), stats.losses(), stats.ties(), stats.count(), stats.winrate(),
                                       stats.epa_rank(), stats.epa_percent()
                                   ))
+
+    def save_team_year_stats(self, team_key: str, year: int, stats: TeamYearStats) -> None:
+        '''Save the stats for a team in a given year'''
+        self.__insert_team_year_stats(team_key, year, stats)
         self.__connection.commit()
+        self.__written()
 
     def get_team_year_stats(self, team_key: str, year: int,
                             cache_expiry: int) -> TeamYearStats | None:
         '''Get the stats for a team in a given year'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM team_year_stats WHERE team_key = ? AND year = ?',
-                       [team_key, year])
+        cursor.execute('SELECT * FROM team_year_stats WHERE team_key = ? AND year = ? '
+                       'AND last_updated >= ?', [team_key, year, oldest])
         result = cursor.fetchone()
         cursor.close()
-        if result is None:
+        if result is None or self.__expired(result[0], fresh, 'team_year_stats', (team_key, year)):
             return None
+        return Cache.__team_year_stats_from_row(result)
+
+    @staticmethod
+    def __team_year_stats_from_row(row: tuple) -> TeamYearStats:
         (
-            timestamp,
+            _,
             team, year,
             epa_start, epa_pre_champs, epa_end, epa_mean, epa_max, epa_diff,
             auto_epa_start, auto_epa_pre_champs, auto_epa_end, auto_epa_mean, auto_epa_max,
@@ -611,12 +1617,9 @@ class Cache:
             rp_2_epa_start, rp_2_epa_pre_champs, rp_2_epa_end, rp_2_epa_mean, rp_2_epa_max,
             norm_epa_end,
             wins, losses, ties, count, winrate,
-            epa_rank, epa_percent
-        ) = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_team_year_stats(team_key, year)
-            return None
+            epa_rank, epa_percent,
+            _, _
+        ) = row
         return TeamYearStats(
             team, year,
             epa_start, epa_pre_champs, epa_end, epa_mean, epa_max, epa_diff,
@@ -637,7 +1640,7 @@ class Cache:
 
     def __init_team_event_stats(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS team_event_stats (
-            last_updated datetime,
+            last_updated int,
             team_key str, event_key str,
             epa_start float, epa_pre_playoffs float, epa_end float,
             epa_mean float, epa_max float, epa_diff float,
@@ -647,13 +1650,16 @@ class Cache:
             rp_1_epa_start float, rp_1_epa_end float, rp_1_epa_mean float, rp_1_epa_max float,
             rp_2_epa_start float, rp_2_epa_end float, rp_2_epa_mean float, rp_2_epa_max float,
             wins int, losses int, ties int, count int, winrate float,
-            rps int, rps_per_match float, rank int, num_teams int
+            rps int, rps_per_match float, rank int, num_teams int,
+            last_accessed int
         )''')
+        self.__add_column('team_event_stats', 'last_accessed', 'int')
+        self.__add_team_number('team_event_stats', 'team_key')
         self.__connection.commit()
 
-    def save_team_event_stats(self, team_key: str, event_key: str, stats: TeamEventStats) -> None:
-        '''Save the stats for a team in a given year'''
-        self._delete_team_year_stats(team_key, event_key)
+    def __insert_team_event_stats(self, team_key: str, event_key: str, stats: TeamEventStats) -> None:
+        self.__connection.execute('DELETE FROM team_event_stats WHERE team_key = ? AND event_key = ?',
+                                  [team_key, event_key])
         self.__connection.execute('INSERT INTO team_event_stats VALUES ('
                                   '?, '
                                   '?, ?, '
@@ -664,8 +1670,8 @@ class Cache:
                                   '?, ?, ?, ?, '
                                   '?, ?, ?, ?, '
                                   '?, ?, ?, ?, ?, '
-                                  '?, ?, ?, ?)', (
-                                      datetime.utcnow().isoformat(),
+                                  '?, ?, ?, ?, NULL)', (
+                                      int(time.time()),
                                       team_key, event_key,
                                       stats.epa_start(), stats.epa_pre_playoffs(), stats.epa_end(
                                       ), stats.epa_mean(), stats.epa_max(), stats.epa_diff(),
@@ -682,14 +1688,20 @@ class Cache:
                                       stats.wins(), stats.losses(), stats.ties(), stats.count(), stats.winrate(),
                                       stats.rps(), stats.rps_per_match(), stats.rank(), stats.num_teams()
                                   ))
+
+    def save_team_event_stats(self, team_key: str, event_key: str, stats: TeamEventStats) -> None:
+        '''Save the stats for a team in a given event'''
+        self.__insert_team_event_stats(team_key, event_key, stats)
         self.__connection.commit()
+        self.__written()
 
     def get_team_event_stats(self, team_key: str, event_key: str,
                              cache_expiry: int) -> TeamEventStats | None:
         '''Get the stats for a team in a given event'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM team_event_stats WHERE team_key = ? AND event_key = ?',
-                       [team_key, event_key])
+        cursor.execute('SELECT * FROM team_event_stats WHERE team_key = ? AND event_key = ? '
+                       'AND last_updated >= ?', [team_key, event_key, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
@@ -703,11 +1715,10 @@ class Cache:
             endgame_epa_start, endgame_epa_pre_playoffs, endgame_epa_end, endgame_epa_mean, endgame_epa_max,
             rp_1_epa_start, rp_1_epa_end, rp_1_epa_mean, rp_1_epa_max,
             rp_2_epa_start, rp_2_epa_end, rp_2_epa_mean, rp_2_epa_max,
-            wins, losses, ties, count, winrate, rps, rps_per_match, rank, num_teams
+            wins, losses, ties, count, winrate, rps, rps_per_match, rank, num_teams,
+            _, _
         ) = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_team_year_stats(team_key, year)
+        if self.__expired(timestamp, fresh, 'team_event_stats', (team_key, event_key)):
             return None
         return TeamEventStats(
             team, year,
@@ -720,23 +1731,236 @@ class Cache:
             wins, losses, ties, count, winrate, rps, rps_per_match, rank, num_teams
         )
 
+    def _delete_team_event_stats(self, team_key: str, event_key: str) -> None:
+        self.__connection.execute('DELETE FROM team_event_stats WHERE team_key = ? AND event_key = ?',
+                                  [team_key, event_key])
+        self.__connection.commit()
+
+    def __stats_table(self, table: str, where: str, key: list,
+                      count: int, oldest: int) -> StatsTable | None:
+        '''Read the stats rows matching `where` as columns, if all `count` of them are cached'''
+        declared = [row for row in self.__connection.execute(f"PRAGMA table_xinfo({table})")
+                    if row[1] not in ('last_updated', 'last_accessed')]
+        names = [row[1] for row in declared]
+        numeric = [row[2].split()[0].lower() in ('int', 'float') for row in declared]
+        cursor = self.__connection.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {where} AND last_updated >= ?",
+                       [*key, oldest])
+        found, = cursor.fetchone()
+        if found < count:
+            cursor.close()
+            return None  # Some of the rows have since been removed
+        cursor.execute(f"SELECT {', '.join(names)} FROM {table} WHERE {where} "
+                       f"AND last_updated >= ? ORDER BY team_number", [*key, oldest])
+        stats = StatsTable.from_rows(names, numeric, cursor)
+        cursor.close()
+        return stats
+
+    def __init_year_stats(self) -> None:
+        self.__connection.execute('''CREATE TABLE IF NOT EXISTS year_stats (
+            last_updated int,
+            year int, count int,
+            last_accessed int
+        )''')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS team_year_stats_year ON team_year_stats (year)')
+        self.__connection.commit()
+
+    def __insert_year_stats(self, year: int, count: int) -> None:
+        self.__connection.execute('DELETE FROM year_stats WHERE year = ?', [year])
+        self.__connection.execute('INSERT INTO year_stats VALUES (?, ?, ?, NULL)', (
+            int(time.time()),
+            year, count
+        ))
+
+    def save_year_stats(self, year: int, stats: list[TeamYearStats]) -> None:
+        '''Save the stats for every team in a given year'''
+        for team_stats in stats:
+            self.__insert_team_year_stats(team_stats.team_key(), year, team_stats)
+        self.__insert_year_stats(year, len(stats))
+        self.__connection.commit()
+        for _ in stats:
+            self.__written()
+
+    def save_many_team_year_stats(self, stats: list[TeamYearStats]) -> None:
+        '''Save the stats for a number of teams in one transaction'''
+        for team_stats in stats:
+            self.__insert_team_year_stats(team_stats.team_key(), team_stats.year(), team_stats)
+        self.__connection.commit()
+        for _ in stats:
+            self.__written()
+
+    def save_year_stats_count(self, year: int, count: int) -> None:
+        '''
+        Record that the stats for all `count` teams in a given year have been
+        saved with `save_many_team_year_stats`
+        '''
+        self.__insert_year_stats(year, count)
+        self.__connection.commit()
+        self.__written()
+
+    def has_year_stats(self, year: int, cache_expiry: int) -> bool:
+        '''Check whether the stats for every team in a given year are fresh'''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT count FROM year_stats WHERE year = ? AND last_updated >= ?',
+                       [year, fresh])
+        result = cursor.fetchone()
+        if result is None:
+            cursor.close()
+            return False
+        cursor.execute('SELECT COUNT(*) FROM team_year_stats WHERE year = ? AND last_updated >= ?',
+                       [year, fresh])
+        found, = cursor.fetchone()
+        cursor.close()
+        return found >= result[0]
+
+    def iter_team_year_stats(self, year: int, cache_expiry: int) -> Iterator[TeamYearStats]:
+        '''
+        Stream the fresh stats for the teams in a given year in order of team
+        number, each row is read from the cursor as it's consumed
+        '''
+        fresh, _ = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT * FROM team_year_stats WHERE year = ? AND last_updated >= ? '
+                       'ORDER BY team_number', [year, fresh])
+        try:
+            for row in cursor:
+                yield Cache.__team_year_stats_from_row(row)
+        finally:
+            cursor.close()
+
+    def get_year_stats(self, year: int, cache_expiry: int) -> StatsTable | None:
+        '''Get the stats for every team in a given year as columns'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT * FROM year_stats WHERE year = ? AND last_updated >= ?',
+                       [year, oldest])
+        result = cursor.fetchone()
+        cursor.close()
+        if result is None:
+            return None
+        timestamp, _, count, _ = result
+        stats = self.__stats_table('team_year_stats', 'year = ?', [year], count, oldest)
+        if stats is None or self.__expired(timestamp, fresh, 'year_stats', (year,)):
+            return None
+        return stats
+
+    def _delete_year_stats(self, year: int) -> None:
+        self.__connection.execute('DELETE FROM year_stats WHERE year = ?', [year])
+        self.__connection.commit()
+
+    def __init_event_stats(self) -> None:
+        self.__connection.execute('''CREATE TABLE IF NOT EXISTS event_stats (
+            last_updated int,
+            event text, count int,
+            last_accessed int
+        )''')
+        self.__connection.execute(
+            'CREATE INDEX IF NOT EXISTS team_event_stats_event ON team_event_stats (event_key)')
+        self.__connection.commit()
+
+    def save_event_stats(self, event_key: str, stats: list[TeamEventStats]) -> None:
+        '''Save the stats for every team in a given event'''
+        for team_stats in stats:
+            self.__insert_team_event_stats(team_stats.team_key(), event_key, team_stats)
+        self.__connection.execute('DELETE FROM event_stats WHERE event = ?', [event_key])
+        self.__connection.execute('INSERT INTO event_stats VALUES (?, ?, ?, NULL)', (
+            int(time.time()),
+            event_key, len(stats)
+        ))
+        self.__connection.commit()
+        for _ in stats:
+            self.__written()
+
+    def get_event_stats(self, event_key: str, cache_expiry: int) -> StatsTable | None:
+        '''Get the stats for every team in a given event as columns'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT * FROM event_stats WHERE event = ? AND last_updated >= ?',
+                       [event_key, oldest])
+        result = cursor.fetchone()
+        cursor.close()
+        if result is None:
+            return None
+        timestamp, _, count, _ = result
+        stats = self.__stats_table('team_event_stats', 'event_key = ?', [event_key], count, oldest)
+        if stats is None or self.__expired(timestamp, fresh, 'event_stats', (event_key,)):
+            return None
+        return stats
+
+    def _delete_event_stats(self, event_key: str) -> None:
+        self.__connection.execute('DELETE FROM event_stats WHERE event = ?', [event_key])
+        self.__connection.commit()
+
+    def __init_event_oprs(self) -> None:
+        self.__connection.execute('''CREATE TABLE IF NOT EXISTS event_oprs (
+            last_updated int,
+            event text, qualifications_only int,
+            fingerprint text, ratings text,
+            last_accessed int
+        )''')
+        self.__connection.commit()
+
+    def save_event_oprs(self, event_key: str, qualifications_only: bool,
+                        fingerprint: str, ratings: StatsTable) -> None:
+        '''Save the ratings computed from the matches identified by `fingerprint` in a given event'''
+        self._delete_event_oprs(event_key, qualifications_only)
+        self.__connection.execute('INSERT INTO event_oprs VALUES (?, ?, ?, ?, ?, NULL)', (
+            int(time.time()),
+            event_key, qualifications_only,
+            fingerprint, serialization.dumps({
+                name: ratings[name].tolist() for name in ('team_number', 'opr', 'dpr')
+            })
+        ))
+        self.__connection.commit()
+        self.__written()
+
+    def get_event_oprs(self, event_key: str, qualifications_only: bool,
+                       fingerprint: str) -> StatsTable | None:
+        '''
+        Get the ratings in a given event if they were computed from the
+        matches identified by `fingerprint`, they don't otherwise expire
+        '''
+        cursor = self.__connection.cursor()
+        cursor.execute('SELECT * FROM event_oprs WHERE event = ? AND qualifications_only = ? '
+                       'AND fingerprint = ?', [event_key, qualifications_only, fingerprint])
+        result = cursor.fetchone()
+        cursor.close()
+        if result is None:
+            return None
+        timestamp, _, _, _, ratings, _ = result
+        # Only records the access, the fingerprint already shows they're current
+        self.__expired(timestamp, timestamp, 'event_oprs', (event_key, qualifications_only))
+        ratings = serialization.loads(ratings)
+        return opr.table(np.array(ratings['team_number'], dtype=np.int64),
+                         np.array(ratings['opr'], dtype=np.float64),
+                         np.array(ratings['dpr'], dtype=np.float64))
+
+    def _delete_event_oprs(self, event_key: str, qualifications_only: bool) -> None:
+        self.__connection.execute('DELETE FROM event_oprs WHERE event = ? AND qualifications_only = ?',
+                                  [event_key, qualifications_only])
+        self.__connection.commit()
+
     def __init_team_precise_locations(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS team_precise_locations (
-            last_updated datetime,
+            last_updated int,
             team_key text,
             city text, state_prov text, country text,
             latitude float, longitude float,
             address text, postal_code text,
-            place_id text
+            place_id text,
+            last_accessed int
         )''')
+        self.__add_column('team_precise_locations', 'last_accessed', 'int')
         self.__connection.commit()
 
     def save_team_precise_location(self, team_key: str, location: PreciseLocation) -> None:
         '''Save the precise location for a team'''
         self._delete_team_precise_location(team_key)
         self.__connection.execute('INSERT INTO team_precise_locations VALUES (?, ?, ?, ?, ?, '
-                                  '?, ?, ?, ?, ?)', (
-                                      datetime.utcnow().isoformat(),
+                                  '?, ?, ?, ?, ?, NULL)', (
+                                      int(time.time()),
                                       team_key,
                                       location.location().city(),
                                       location.location().state_prov(),
@@ -747,13 +1971,16 @@ class Cache:
                                       location.place_id()
                                   ))
         self.__connection.commit()
+        self.__written()
 
     def get_team_precise_location(self, team_key: str,
                                   cache_expiry: int) -> PreciseLocation | None:
         '''Get the precise location for a team'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
         cursor.execute(
-            'SELECT * FROM team_precise_locations WHERE team_key = ?', [team_key])
+            'SELECT * FROM team_precise_locations WHERE team_key = ? AND last_updated >= ?',
+            [team_key, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
@@ -765,11 +1992,10 @@ class Cache:
             latitude, longitude,
             address,
             postal_code,
-            place_id
+            place_id,
+            _
         ) = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_team_precise_location(team_key)
+        if self.__expired(timestamp, fresh, 'team_precise_locations', (team_key,)):
             return None
         return PreciseLocation(
             Location(city, state_prov, country),
@@ -786,38 +2012,40 @@ class Cache:
 
     def __init_precise_distances(self) -> None:
         self.__connection.execute('''CREATE TABLE IF NOT EXISTS precise_distances (
-            last_updated datetime,
+            last_updated int,
             origin_id text, destination_id text,
-            distance float
+            distance float,
+            last_accessed int
         )''')
+        self.__add_column('precise_distances', 'last_accessed', 'int')
         self.__connection.commit()
 
     def save_precise_distance(self, origin_id: str, destination_id: str, meters: float) -> None:
         '''Save the precise distance for a pair of IDs'''
         self._delete_precise_distances(origin_id, destination_id)
-        self.__connection.execute('INSERT into precise_distances VALUES (?, ?, ?, ?)', (
-            datetime.utcnow().isoformat(),
+        self.__connection.execute('INSERT into precise_distances VALUES (?, ?, ?, ?, NULL)', (
+            int(time.time()),
             origin_id, destination_id,
             meters
         ))
         self.__connection.commit()
+        self.__written()
 
     def get_precise_distance(self, origin_id: str, destination_id: str, cache_expiry: int
                              ) -> float | None:
         '''Get the precise distance for two IDs'''
+        fresh, oldest = self.__cutoffs(cache_expiry)
         cursor = self.__connection.cursor()
-        cursor.execute('SELECT * FROM precise_distances WHERE origin_id = ? AND destination_id = ?',
-                       [origin_id, destination_id])
+        cursor.execute('SELECT * FROM precise_distances WHERE origin_id = ? AND destination_id = ? '
+                       'AND last_updated >= ?', [origin_id, destination_id, oldest])
         result = cursor.fetchone()
         cursor.close()
         if result is None:
             return None
         (
-            timestamp, _, _, meters
+            timestamp, _, _, meters, _
         ) = result
-        timestamp = datetime.fromisoformat(timestamp)
-        if timestamp + timedelta(days=cache_expiry) < datetime.utcnow():
-            self._delete_precise_distances(origin_id, destination_id)
+        if self.__expired(timestamp, fresh, 'precise_distances', (origin_id, destination_id)):
             return None
         return meters
 
@@ -0,0 +1,177 @@
+'''
+Elo ratings computed from the cached matches
+'''
+import time
+import numpy as np
+from . import serialization
+from .cache import Cache
+from .models import StatsTable, Team
+
+
+class Elo:
+    '''
+    Rates teams by replaying the cached matches in chronological order. Each
+    alliance is rated by the mean rating of its teams, and every team on it
+    gains or loses the alliance's rating change. Ratings are regressed toward
+    the initial rating between seasons.
+
+    The engine can be saved and loaded, and `update` only replays the matches
+    ordered after the last one it rated, so a checkpoint can be resumed as new
+    matches are cached. Matches cached since the last update but ordered
+    before that point, like another event of the same week fetched later or a
+    backfilled past season, can't be rated in order, so every cached match is
+    replayed again when one appears.
+    '''
+
+    def __init__(self, k: float = 32, initial: float = 1500,
+                 regression: float = 0.2, scale: float = 400):
+        self.__k = k
+        self.__initial = initial
+        self.__regression = regression
+        self.__scale = scale
+        self.__reset()
+
+    def __reset(self) -> None:
+        # Indexed by team number, index 0 stands in for an empty station
+        self.__ratings = np.full(1, self.__initial, dtype=np.float64)
+        self.__matches = np.zeros(1, dtype=np.int64)
+        self.__year: int | None = None
+        self.__position: tuple | None = None
+        # Keys of the rated matches and the time of the last update, to find
+        # matches cached since then that are ordered before the position
+        self.__rated: set[str] = set()
+        self.__updated: int | None = None
+
+    def update(self, cache: Cache) -> int:
+        '''
+        Rate the cached matches played since the last update, returning how
+        many were rated. Every cached match is rated again if any of them are
+        ordered before the last one rated.
+        '''
+        started = int(time.time())
+        results = cache.get_match_results(self.__position)
+        if self.__position is not None and (
+                any(result[6] in self.__rated for result in results) or
+                self.__updated is not None and any(
+                    result[6] not in self.__rated for result in cache.get_match_results(
+                        until=self.__position, updated_since=self.__updated))):
+            # A rated match has moved, such as when its event was cached and
+            # it's no longer timed by the event, or a match was cached out of order
+            self.__reset()
+            results = cache.get_match_results()
+        self.__updated = started
+        if len(results) == 0:
+            return 0
+        years = np.fromiter((result[0] for result in results), dtype=np.int64, count=len(results))
+        numbers = np.array([result[7:] for result in results], dtype=np.int64)
+        scores, teams = numbers[:, :2], numbers[:, 2:]
+        self.__grow(int(teams.max()))
+        for start, end in Elo.__waves(years, teams):
+            if years[start] != self.__year:
+                if self.__year is not None:
+                    self.__regress()
+                self.__year = int(years[start])
+            self.__rate(scores[start:end], teams[start:end])
+        self.__position = tuple(results[-1][:7])
+        self.__rated.update(result[6] for result in results)
+        return len(results)
+
+    @staticmethod
+    def __waves(years: np.ndarray, teams: np.ndarray) -> list[tuple[int, int]]:
+        '''
+        Split matches into runs that share no team and season, which can be
+        rated at once with the same result as rating them one at a time
+        '''
+        waves = []
+        start = 0
+        seen: set[int] = set()
+        years = years.tolist()
+        for i, row in enumerate(teams.tolist()):
+            members = {team for team in row if team != 0}
+            if years[i] != years[start] or not seen.isdisjoint(members):
+                waves.append((start, i))
+                start = i
+                seen = set()
+            seen |= members
+        waves.append((start, len(teams)))
+        return waves
+
+    def __grow(self, team_number: int) -> None:
+        if team_number < len(self.__ratings):
+            return
+        ratings = np.full(team_number + 1, self.__initial, dtype=np.float64)
+        ratings[:len(self.__ratings)] = self.__ratings
+        matches = np.zeros(team_number + 1, dtype=np.int64)
+        matches[:len(self.__matches)] = self.__matches
+        self.__ratings, self.__matches = ratings, matches
+
+    def __regress(self) -> None:
+        self.__ratings += self.__regression * (self.__initial - self.__ratings)
+
+    def __rate(self, scores: np.ndarray, teams: np.ndarray) -> None:
+        present = teams != 0
+        ratings = np.where(present, self.__ratings[teams], 0)
+        red = ratings[:, :3].sum(axis=1) / np.maximum(present[:, :3].sum(axis=1), 1)
+        blue = ratings[:, 3:].sum(axis=1) / np.maximum(present[:, 3:].sum(axis=1), 1)
+        expected = 1 / (1 + 10 ** ((blue - red) / self.__scale))
+        actual = np.sign(scores[:, 0] - scores[:, 1]) / 2 + 0.5
+        change = self.__k * (actual - expected)
+        changes = np.where(present, np.concatenate([
+            np.repeat(change[:, None], 3, axis=1), np.repeat(-change[:, None], 3, axis=1)
+        ], axis=1), 0)
+        # Teams are unique within a wave, only the empty station repeats
+        self.__ratings[teams] += changes
+        self.__matches[teams] += present
+        self.__ratings[0] = self.__initial
+        self.__matches[0] = 0
+
+    def rating(self, team: str) -> float:
+        '''Returns the current rating of a team'''
+        number = Team.team_key_to_number(team)
+        if number >= len(self.__ratings):
+            return self.__initial
+        return float(self.__ratings[number])
+
+    def ratings(self) -> dict[str, float]:
+        '''Returns the current rating of every rated team'''
+        numbers = np.flatnonzero(self.__matches)
+        return dict(zip((Team.team_number_to_key(number) for number in numbers.tolist()),
+                        self.__ratings[numbers].tolist()))
+
+    def table(self) -> StatsTable:
+        '''Returns the rating and number of rated matches of every rated team as columns'''
+        numbers = np.flatnonzero(self.__matches)
+        return StatsTable({
+            'team_key': [Team.team_number_to_key(number) for number in numbers.tolist()],
+            'team_number': numbers,
+            'rating': self.__ratings[numbers],
+            'matches': self.__matches[numbers]
+        }, len(numbers))
+
+    def save(self, path: str) -> None:
+        '''Save the state of this engine to a NumPy archive'''
+        np.savez(path, ratings=self.__ratings, matches=self.__matches,
+                 rated=np.array(sorted(self.__rated), dtype=str),
+                 state=np.array(serialization.dumps({
+                     'k': self.__k, 'initial': self.__initial,
+                     'regression': self.__regression, 'scale': self.__scale,
+                     'year': self.__year, 'position': self.__position,
+                     'updated': self.__updated
+                 })))
+
+    @staticmethod
+    def load(path: str) -> 'Elo':
+        '''Load an engine saved with `save`'''
+        with np.load(path) as archive:
+            state = serialization.loads(str(archive['state']))
+            elo = Elo(state['k'], state['initial'], state['regression'], state['scale'])
+            elo.__ratings = archive['ratings']
+            elo.__matches = archive['matches']
+            # Engines saved before the rated matches were kept can't find
+            # matches cached out of order
+            if 'rated' in archive.files:
+                elo.__rated = set(archive['rated'].tolist())
+        elo.__year = state['year']
+        elo.__position = None if state['position'] is None else tuple(state['position'])
+        elo.__updated = state.get('updated')
+        return elo
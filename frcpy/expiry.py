@@ -0,0 +1,58 @@
+'''
+Expiry policies for cached data
+'''
+from datetime import datetime, timedelta
+
+
+class ExpiryPolicy:
+    '''
+    Flat expiry policy, every entry uses the requested cache expiry
+    '''
+
+    def year_expiry(self, cache_expiry: float, year: int) -> float:
+        '''Returns the expiry in days for data belonging to a season'''
+        return cache_expiry
+
+    def event_expiry(self, cache_expiry: float, year: int,
+                     end_date: datetime | None) -> float:
+        '''Returns the expiry in days for data belonging to an event'''
+        return cache_expiry
+
+
+class SeasonExpiryPolicy(ExpiryPolicy):
+    '''
+    Expiry policy that keeps data for past seasons and completed events
+    effectively forever, while data that can still change expires quickly
+    '''
+
+    def __init__(self, season_expiry: float = 7, event_expiry: float = 1 / 24,
+                 grace_period: float = 7, permanent_expiry: float = 36500,
+                 current_year: int | None = None):
+        self.__season_expiry = season_expiry
+        self.__event_expiry = event_expiry
+        self.__grace_period = grace_period
+        self.__permanent_expiry = permanent_expiry
+        self.__current_year = current_year
+
+    def current_year(self) -> int:
+        '''Returns the season considered current'''
+        if self.__current_year is not None:
+            return self.__current_year
+        return datetime.utcnow().year
+
+    def year_expiry(self, cache_expiry: float, year: int) -> float:
+        '''Returns the expiry in days for data belonging to a season'''
+        if year < self.current_year():
+            return self.__permanent_expiry
+        return min(cache_expiry, self.__season_expiry)
+
+    def event_expiry(self, cache_expiry: float, year: int,
+                     end_date: datetime | None) -> float:
+        '''Returns the expiry in days for data belonging to an event'''
+        if year < self.current_year():
+            return self.__permanent_expiry
+        if end_date is not None and \
+                end_date + timedelta(days=self.__grace_period) < datetime.utcnow():
+            return self.__permanent_expiry
+        # Unknown end dates are treated as live, the event hasn't been cached yet
+        return min(cache_expiry, self.__event_expiry)
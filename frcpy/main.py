@@ -1,12 +1,24 @@
 '''
 Interact with the TBA and Statbotics APIs
 '''
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from itertools import chain
+from threading import local
+from typing import Any, Callable, Iterator
 import googlemaps
+import numpy as np
+import requests
 import tbapy
+from tbapy.models import LastModifiedDate
 import statbotics
-from .models import Location, PreciseLocation, Team, TeamEventStats, TeamYearStats, Webcast, Event, MatchAlliance, MatchVideo, Match
+from .models import Location, PreciseLocation, Team, TeamEventStats, TeamYearStats, StatsTable, Webcast, Event, MatchAlliance, MatchVideo, Match
 from .cache import Cache
+from .expiry import ExpiryPolicy
+from .elo import Elo
+from . import opr
+from .simulation import AllianceSelection, BracketSimulator, RankingSimulator, Rankings, win_probabilities
+from .workers import Refresher
 
 
 class FRCPy:
@@ -41,19 +53,75 @@ class FRCPy:
                     winner = 'tie'  # TBA does not give us a tie
         return winner
 
-    def __init__(self, tba_token: str, gmaps_token: str = ''):
+    # Client methods used to refresh a stale row of each cache table, the
+    # cache reports the row's key in the same order as the method arguments
+    __REFRESH_METHODS = {
+        'team_index': 'teams',
+        'teams': 'team',
+        'team_years': 'team_years',
+        'team_year_events': 'team_year_events',
+        'year_events': 'year_events',
+        'events': 'event',
+        'event_teams': 'event_teams',
+        'event_matches': 'event_matches',
+        'team_event_matches': 'team_event_matches',
+        'matches': 'match',
+        'team_year_matches': 'team_matches',
+        'team_year_stats': 'team_year_stats',
+        'team_event_stats': 'team_event_stats',
+        'year_stats': 'team_year_stats_table',
+        'event_stats': 'event_stats_table'
+    }
+
+    # Expiry used to read back a row that was renewed just now
+    __RENEWED = 1
+    # Number of rows requested per page of a Statbotics listing
+    __STATBOTICS_PAGE = 1000
+    # Number of concurrent TBA requests when prefetching in bulk
+    __PREFETCH_WORKERS = 8
+
+    def __init__(self, tba_token: str, gmaps_token: str = '',
+                 expiry_policy: ExpiryPolicy | None = None,
+                 cache_dir: str = './cache', max_stale: float | None = None,
+                 max_rows: dict[str, int] | None = None, max_bytes: dict[str, int] | None = None,
+                 on_refresh_error: Callable[[str, tuple, Exception], None] | None = None):
+        '''
+        When `max_stale` is given, expired entries up to `max_stale` days past
+        their expiry are returned immediately and refreshed in the background,
+        failed refreshes are passed to `on_refresh_error`, see `Refresher`.
+        `max_rows` and `max_bytes` limit the size of cache tables, see `Cache`.
+        '''
         self.__tba_client = tbapy.TBA(tba_token)
+        self.__tba_factory = lambda: FRCPy.__worker_tba_client(tba_token)
+        self.__tba_workers = local()
         self.__statbotics_client = statbotics.Statbotics()
         if gmaps_token != '':
             self.__gmaps_client = googlemaps.Client(gmaps_token)
         else:
             self.__gmaps_client = None
-        self.__cache = Cache()
+        if expiry_policy is None:
+            expiry_policy = ExpiryPolicy()
+        self.__expiry_policy = expiry_policy
+        if max_stale is not None:
+            def refresher_api() -> FRCPy:
+                # tbapy shares one session between clients, the refresher's has its own
+                api = FRCPy(tba_token, gmaps_token, expiry_policy, cache_dir,
+                            max_rows=max_rows, max_bytes=max_bytes)
+                api.__tba_client = FRCPy.__worker_tba_client(tba_token)
+                return api
+            self.__refresher = Refresher(refresher_api, on_refresh_error)
+            self.__cache = Cache(cache_dir, max_stale, self.__refresh,
+                                 max_rows=max_rows, max_bytes=max_bytes)
+        else:
+            self.__refresher = None
+            self.__cache = Cache(cache_dir, max_rows=max_rows, max_bytes=max_bytes)
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.__refresher is not None:
+            self.__refresher.close()
         self.__cache.__exit__(exc_type, exc_value, traceback)
 
     def _tba_client(self) -> tbapy.TBA:
@@ -68,6 +136,62 @@ class FRCPy:
     def _cache(self) -> Cache:
         return self.__cache
 
+    def _expiry_policy(self) -> ExpiryPolicy:
+        return self.__expiry_policy
+
+    def __refresh(self, table: str, key: tuple) -> bool:
+        try:
+            method = FRCPy.__REFRESH_METHODS[table]
+        except KeyError:
+            return False  # Entry can't be refreshed on its own, fetch it now
+        self.__refresher.submit(method, key)
+        return True
+
+    def __year_expiry(self, year: int, cache_expiry: float) -> float:
+        return self.__expiry_policy.year_expiry(cache_expiry, year)
+
+    def __event_expiry(self, event: str, cache_expiry: float) -> float:
+        dates = self.__cache.get_event_dates(event)
+        end_date = None if dates is None else dates[1]
+        return self.__expiry_policy.event_expiry(
+            cache_expiry, Event.event_key_to_year(event), end_date)
+
+    def __tba_fetch(self, cached: bool, table: str, key: tuple, fetch: Callable, *args, **kwargs
+                    ) -> tuple[Any, str | None] | None:
+        '''
+        Fetch data from TBA along with its Last-Modified header. When the cache
+        holds an expired copy the request is made conditional on it, and None is
+        returned if TBA reports it unchanged after renewing the cached copy.
+        '''
+        last_modified = None
+        if cached:
+            last_modified = self.__cache.get_last_modified(table, key)
+        result = FRCPy.__tba_request(fetch, last_modified, *args, **kwargs)
+        if result is None:
+            self.__cache.touch(table, key)
+        return result
+
+    @staticmethod
+    def __tba_request(fetch: Callable, last_modified: str | None, *args, **kwargs
+                      ) -> tuple[Any, str | None] | None:
+        '''
+        Fetch data from TBA along with its Last-Modified header, conditional on
+        `last_modified` when it's given. Returns None if TBA reports the data
+        unchanged. Unlike `__tba_fetch` this doesn't use the cache, so worker
+        threads can make the request.
+        '''
+        if last_modified is None:
+            data, last_modified = fetch(*args, last_modified=True, **kwargs)
+        else:
+            result = fetch(*args, last_modified=True,
+                           if_modified_since=LastModifiedDate(last_modified).date, **kwargs)
+            if isinstance(result, LastModifiedDate):
+                return None
+            data, last_modified = result
+        if not isinstance(last_modified, LastModifiedDate):
+            return data, None  # TBA didn't send a Last-Modified header
+        return data, last_modified.date_string
+
     # The Blue Alliance API provided data
 
     def year_range(self) -> tuple[int, int]:
@@ -100,30 +224,146 @@ class FRCPy:
             participation = self.__cache.get_team_years(team, cache_expiry)
             if participation is not None:
                 return participation
-        participation = self.__tba_client.team_years(team)
+        result = self.__tba_fetch(cached, 'team_years', (team,),
+                                  self.__tba_client.team_years, team)
+        if result is None:
+            return self.__cache.get_team_years(team, FRCPy.__RENEWED)
+        participation, last_modified = result
         if cached:
-            self.__cache.save_team_years(team, participation)
+            self.__cache.save_team_years(team, participation, last_modified)
         return participation
 
+    @staticmethod
+    def __worker_tba_client(tba_token: str) -> tbapy.TBA:
+        '''
+        Returns a TBA client for a worker thread. tbapy keeps the state of a
+        request on the client and shares one session between clients, so
+        concurrent requests each need a client with its own session.
+        '''
+        client = tbapy.TBA(tba_token)
+        client.session = requests.Session()
+        client.session.headers.update({'X-TBA-Auth-Key': tba_token})
+        return client
+
+    def __worker_tba(self) -> tbapy.TBA:
+        '''Returns the TBA client of the calling worker thread'''
+        client = getattr(self.__tba_workers, 'client', None)
+        if client is None:
+            client = self.__tba_factory()
+            self.__tba_workers.client = client
+        return client
+
+    def __prefetch_team_years(self, teams: list[str]) -> None:
+        '''Fetch the years of a number of teams concurrently and cache them together'''
+        def fetch(team: str) -> tuple[str, list[int], str | None]:
+            years, last_modified = self.__worker_tba().team_years(team, last_modified=True)
+            if not isinstance(last_modified, LastModifiedDate):
+                return team, years, None
+            return team, years, last_modified.date_string
+
+        with ThreadPoolExecutor(FRCPy.__PREFETCH_WORKERS) as executor:
+            self.__cache.save_many_team_years(list(executor.map(fetch, teams)))
+
+    def participation_summary(self, cache_expiry: int = 90) -> StatsTable:
+        '''
+        Get the number of rookie, returning and participating teams in each
+        year, and of teams participating for the last time. Teams in the
+        latest year aren't counted as participating for the last time.
+        '''
+        teams = self.teams(cache_expiry=cache_expiry)
+        team_years = self.__cache.get_all_team_years(cache_expiry)
+        missing = [team for team in teams if team not in team_years]
+        if len(missing) > 0:
+            self.__prefetch_team_years(missing)
+            team_years = self.__cache.get_all_team_years(cache_expiry)
+        participation = [years for years in team_years.values() if len(years) > 0]
+        if len(participation) == 0:
+            return StatsTable({}, 0)
+        lengths = np.fromiter(map(len, participation), dtype=np.int64, count=len(participation))
+        years = np.fromiter(chain.from_iterable(participation), dtype=np.int64, count=int(lengths.sum()))
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        firsts = np.minimum.reduceat(years, offsets)
+        lasts = np.maximum.reduceat(years, offsets)
+        latest = int(years.max())
+        lasts = lasts[lasts != latest]
+        start = int(years.min())
+        length = latest - start + 1
+        participants = np.bincount(years - start, minlength=length)
+        rookies = np.bincount(firsts - start, minlength=length)
+        return StatsTable({
+            'year': np.arange(start, latest + 1),
+            'rookies': rookies,
+            'returning': participants - rookies,
+            'participants': participants,
+            'last': np.bincount(lasts - start, minlength=length)
+        }, length)
+
+    @staticmethod
+    def __team_from_api(team: Any) -> Team:
+        return Team(
+            team.key,
+            team.nickname,
+            team.name,
+            Location(team.city, team.state_prov, team.country),
+            team.school_name,
+            team.website,
+            team.rookie_year,
+            team.motto
+        )
+
+    def __prefetch_teams(self) -> None:
+        '''
+        Fetch every team a page at a time and cache them along with the team
+        index, each page with its Last-Modified header
+        '''
+        teams = []
+        page = 0
+        while True:
+            teams_page, last_modified = FRCPy.__tba_request(self.__tba_client.teams, None, page=page)
+            if len(teams_page) == 0:
+                break
+            teams_page = [FRCPy.__team_from_api(team) for team in teams_page]
+            self.__cache.save_teams(teams_page, last_modified)
+            teams += [team.key() for team in teams_page]
+            page += 1
+        self.__cache.save_team_index(teams)
+
+    def teams_in(self, state_prov: str | None = None, country: str | None = None,
+                 cache_expiry: int = 90) -> list[str]:
+        '''
+        Get the teams from a state or province and country, either can be
+        omitted. Teams are fetched in bulk unless every team is cached.
+        '''
+        if self.__cache.get_team_index(cache_expiry) is None or \
+                self.__cache.count_uncached_teams(cache_expiry) > 0:
+            self.__prefetch_teams()
+        return self.__cache.get_teams_in(state_prov, country, cache_expiry)
+
+    def search(self, text: str, kind: str = 'team', limit: int = 10) -> list[str]:
+        '''
+        Search the cached teams by nickname, sponsors, school, city and
+        number, or the cached events by name, returning the best matching
+        keys. Nothing is fetched so it's fast enough to search as the user
+        types, `teams_in` and `events_where` cache teams and events in bulk.
+        '''
+        tables = {'team': 'teams', 'event': 'events'}
+        if kind not in tables:
+            raise ValueError(f"Unknown kind {kind!r}, expected 'team' or 'event'")
+        return self.__cache.search(tables[kind], text, limit)
+
     def team(self, key: str, cached: bool = True, cache_expiry: int = 90) -> Team:
         '''Get a team'''
         if cached:
             team = self.__cache.get_team(key, cache_expiry)
             if team is not None:
                 return team
-        api_data = self.__tba_client.team(key)
-        team = Team(
-            key,
-            api_data.nickname,
-            api_data.name,
-            Location(api_data.city, api_data.state_prov, api_data.country),
-            api_data.school_name,
-            api_data.website,
-            api_data.rookie_year,
-            api_data.motto
-        )
+        result = self.__tba_fetch(cached, 'teams', (key,), self.__tba_client.team, key)
+        if result is None:
+            return self.__cache.get_team(key, FRCPy.__RENEWED)
+        api_data, last_modified = result
+        team = FRCPy.__team_from_api(api_data)
         if cached:
-            self.__cache.save_team(team)
+            self.__cache.save_team(team, last_modified)
         return team
 
     def team_year_events(self, team: str, year: int, cached: bool = True,
@@ -131,23 +371,32 @@ class FRCPy:
         '''Get the events a team has participated in in a year'''
         if cached:
             events = self.__cache.get_team_year_events(
-                team, year, cache_expiry)
+                team, year, self.__year_expiry(year, cache_expiry))
             if events is not None:
                 return events
-        events = self.__tba_client.team_events(team, year, keys=True)
+        result = self.__tba_fetch(cached, 'team_year_events', (team, year),
+                                  self.__tba_client.team_events, team, year, keys=True)
+        if result is None:
+            return self.__cache.get_team_year_events(team, year, FRCPy.__RENEWED)
+        events, last_modified = result
         if cached:
-            self.__cache.save_team_year_events(team, year, events)
+            self.__cache.save_team_year_events(team, year, events, last_modified)
         return events
 
     def year_events(self, year: int, cached: bool = True, cache_expiry: int = 90) -> list[str]:
         '''Get all the events in a year'''
         if cached:
-            events = self.__cache.get_year_events(year, cache_expiry)
+            events = self.__cache.get_year_events(
+                year, self.__year_expiry(year, cache_expiry))
             if events is not None:
                 return events
-        events = self.__tba_client.events(year, keys=True)
+        result = self.__tba_fetch(cached, 'year_events', (year,),
+                                  self.__tba_client.events, year, keys=True)
+        if result is None:
+            return self.__cache.get_year_events(year, FRCPy.__RENEWED)
+        events, last_modified = result
         if cached:
-            self.__cache.save_year_events(year, events)
+            self.__cache.save_year_events(year, events, last_modified)
         return events
 
     def _event_precise_location(self, precise_location: PreciseLocation) -> PreciseLocation | None:
@@ -161,13 +410,7 @@ class FRCPy:
         return PreciseLocation(precise_location.location(), lat, lng,
                                 address, postal_code, place_id)
 
-    def event(self, key: str, cached: bool = True, cache_expiry: int = 90) -> Event:
-        '''Get an event'''
-        if cached:
-            event = self.__cache.get_event(key, cache_expiry)
-            if event is not None:
-                return event
-        event = self.__tba_client.event(key)
+    def __event_from_api(self, event: Any) -> Event:
         district = event.district
         if district is not None:
             district = district['key']
@@ -187,60 +430,138 @@ class FRCPy:
         precise_location = self._event_precise_location(PreciseLocation(location, event.lat, event.lng, event.address, event.postal_code, event.gmaps_place_id))
         start_date = datetime.strptime(event.start_date, '%Y-%m-%d')
         end_date = datetime.strptime(event.end_date, '%Y-%m-%d')
-        event = Event(
-            key, event.name, location, event.event_type,
+        return Event(
+            event.key, event.name, location, event.event_type,
             (start_date, end_date), district, event.short_name, event.week,
             precise_location, event.location_name, event.timezone,
             event.website, event.first_event_id, event.first_event_code,
             webcasts, event.division_keys,
             event.parent_event_key, event.playoff_type
         )
+
+    def __prefetch_events(self, year: int) -> None:
+        '''
+        Fetch every event in a year with one request, conditional on the cached
+        list of them, and cache them along with the list
+        '''
+        result = FRCPy.__tba_request(self.__tba_client.events,
+                                     self.__cache.get_last_modified('year_events', (year,)), year)
+        if result is None:
+            self.__cache.touch_year_events(year)
+            if self.__cache.count_uncached_events(year, FRCPy.__RENEWED) == 0:
+                return
+            # The list was cached without all of its events, which are fetched in full
+            result = FRCPy.__tba_request(self.__tba_client.events, None, year)
+        api_events, last_modified = result
+        events = [self.__event_from_api(event) for event in api_events]
+        self.__cache.save_events(events, last_modified)
+        self.__cache.save_year_events(year, [event.key() for event in events], last_modified)
+
+    def events_where(self, year: int, district: str | None = None, week: int | None = None,
+                     event_type: int | None = None, cache_expiry: int = 90) -> list[str]:
+        '''
+        Get the events in a year in a district, given by its key or
+        abbreviation, in a week and of a type, each can be omitted. The
+        year's events are fetched in bulk unless they're all cached.
+        '''
+        expiry = self.__year_expiry(year, cache_expiry)
+        if self.__cache.count_uncached_events(year, expiry) != 0:
+            self.__prefetch_events(year)
+        if district is not None and not district[:4].isdigit():
+            district = f"{year}{district}"
+        return self.__cache.get_events_where(year, district, week, event_type, expiry)
+
+    def iter_events(self, year: int, cache_expiry: int = 90) -> Iterator[Event]:
+        '''
+        Stream the events in a year from the cache in order of their start.
+        The year's events are fetched in bulk unless they're all cached.
+        '''
+        expiry = self.__year_expiry(year, cache_expiry)
+        if self.__cache.count_uncached_events(year, expiry) != 0:
+            self.__prefetch_events(year)
+            expiry = FRCPy.__RENEWED
+        yield from self.__cache.iter_events(year, expiry)
+
+    def team_season_event_profile(self, year: int, cache_expiry: int = 90) -> StatsTable:
+        '''
+        Get the number of regionals, district events, district championships,
+        championships and other events each team attended in a year, for the
+        teams whose events in that year are cached
+        '''
+        expiry = self.__year_expiry(year, cache_expiry)
+        if len(self.__cache.get_uncached_year_events(year, expiry)) > 0:
+            self.__prefetch_events(year)
+        return self.__cache.get_team_event_profile(year, expiry)
+
+    def event(self, key: str, cached: bool = True, cache_expiry: int = 90) -> Event:
+        '''Get an event'''
+        if cached:
+            event = self.__cache.get_event(
+                key, self.__event_expiry(key, cache_expiry))
+            if event is not None:
+                return event
+        result = self.__tba_fetch(cached, 'events', (key,), self.__tba_client.event, key)
+        if result is None:
+            return self.__cache.get_event(key, FRCPy.__RENEWED)
+        event, last_modified = result
+        event = self.__event_from_api(event)
         if cached:
-            self.__cache.save_event(event)
+            self.__cache.save_event(event, last_modified)
         return event
 
     def event_teams(self, event: str, cached: bool = True, cache_expiry: int = 90) -> list[str]:
         '''Get the teams that have participated in an event'''
         if cached:
-            teams = self.__cache.get_event_teams(event, cache_expiry)
+            teams = self.__cache.get_event_teams(
+                event, self.__event_expiry(event, cache_expiry))
             if teams is not None:
                 return teams
-        teams = self.__tba_client.event_teams(event, keys=True)
+        result = self.__tba_fetch(cached, 'event_teams', (event,),
+                                  self.__tba_client.event_teams, event, keys=True)
+        if result is None:
+            return self.__cache.get_event_teams(event, FRCPy.__RENEWED)
+        teams, last_modified = result
         if cached:
-            self.__cache.save_event_teams(event, teams)
+            self.__cache.save_event_teams(event, teams, last_modified)
         return teams
 
     def event_matches(self, event: str, cached: bool = True, cache_expiry: int = 90) -> list[str]:
         '''Get the matches in an event'''
         if cached:
-            matches = self.__cache.get_event_matches(event, cache_expiry)
+            matches = self.__cache.get_event_matches(
+                event, self.__event_expiry(event, cache_expiry))
             if matches is not None:
                 return matches
-        matches = self.__tba_client.event_matches(event, keys=True)
+        result = self.__tba_fetch(cached, 'event_matches', (event,),
+                                  self.__tba_client.event_matches, event, keys=True)
+        if result is None:
+            return self.__cache.get_event_matches(event, FRCPy.__RENEWED)
+        matches, last_modified = result
         if cached:
-            self.__cache.save_event_matches(event, matches)
+            self.__cache.save_event_matches(event, matches, last_modified)
         return matches
 
     def team_event_matches(self, team: str, event: str, cached: bool = True,
                            cache_expiry: int = 90) -> list[str]:
         '''Get the matches a team has participated in an event'''
         if cached:
-            matches = self.__cache.get_team_event_matches(
-                team, event, cache_expiry)
+            expiry = self.__event_expiry(event, cache_expiry)
+            matches = self.__cache.get_team_event_matches(team, event, expiry)
+            if matches is None:
+                matches = self.__cache.get_event_team_matches(team, event, expiry)
             if matches is not None:
                 return matches
-        matches = self.__tba_client.team_matches(team, event, keys=True)
+        result = self.__tba_fetch(cached, 'team_event_matches', (team, event),
+                                  self.__tba_client.team_matches, team, event, keys=True)
+        if result is None:
+            return self.__cache.get_team_event_matches(team, event, FRCPy.__RENEWED)
+        matches, last_modified = result
         if cached:
-            self.__cache.save_team_event_matches(team, event, matches)
+            self.__cache.save_team_event_matches(team, event, matches, last_modified)
         return matches
 
-    def match(self, key: str, cached: bool = True, cache_expiry: int = 90) -> Match:
-        '''Get a match'''
-        if cached:
-            match = self.__cache.get_match(key, cache_expiry)
-            if match is not None:
-                return match
-        match = self.__tba_client.match(key)
+    @staticmethod
+    def __match_from_api(match: Any) -> Match:
         red_score = match.alliances['red']['score']
         blue_score = match.alliances['blue']['score']
         winner = FRCPy.__validate_winner(
@@ -260,8 +581,8 @@ class FRCPy:
         post_result_time = match.post_result_time
         if post_result_time is not None:
             post_result_time = datetime.fromtimestamp(post_result_time)
-        match = Match(
-            key, match.comp_level, match.set_number, match.match_number,
+        return Match(
+            match.key, match.comp_level, match.set_number, match.match_number,
             red_score, blue_score,
             MatchAlliance(
                 match.alliances['red']['team_keys'],
@@ -278,25 +599,219 @@ class FRCPy:
             predicted_time,
             actual_time,
             post_result_time,
-            videos
+            videos,
+            match.get('score_breakdown')
         )
+
+    def match(self, key: str, cached: bool = True, cache_expiry: int = 90) -> Match:
+        '''Get a match'''
+        if cached:
+            match = self.__cache.get_match(key, self.__event_expiry(
+                Match.match_key_to_event(key), cache_expiry))
+            if match is not None:
+                return match
+        result = self.__tba_fetch(cached, 'matches', (key,), self.__tba_client.match, key)
+        if result is None:
+            return self.__cache.get_match(key, FRCPy.__RENEWED)
+        match, last_modified = result
+        match = FRCPy.__match_from_api(match)
         if cached:
-            self.__cache.save_match(match)
+            self.__cache.save_match(match, last_modified)
         return match
 
-    # Statbotics API provided data
+    def team_matches(self, team: str, year: int, cached: bool = True,
+                     cache_expiry: int = 90) -> list[str]:
+        '''Get the matches a team has played in a year'''
+        if cached:
+            matches = self.__cache.get_team_year_matches(
+                team, year, self.__year_expiry(year, cache_expiry))
+            if matches is not None:
+                return matches
+        # The full matches are fetched so that the season can be listed from the cache
+        result = self.__tba_fetch(cached, 'team_year_matches', (team, year),
+                                  self.__tba_client.team_matches, team, year=year)
+        if result is None:
+            matches = self.__cache.get_team_year_matches(team, year, FRCPy.__RENEWED)
+            if matches is not None:
+                return matches
+            result = self.__tba_fetch(False, 'team_year_matches', (team, year),
+                                      self.__tba_client.team_matches, team, year=year)
+        api_matches, last_modified = result
+        matches = [FRCPy.__match_from_api(match) for match in api_matches]
+        if cached:
+            self.__cache.save_matches(matches, last_modified)
+            self.__cache.save_team_year_matches(team, year, len(matches), last_modified)
+        return sorted(match.key() for match in matches)
 
-    def team_year_stats(self, team: str, year: int, cached: bool = True,
-                        cache_expiry: int = 90) -> TeamYearStats:
-        '''Get the stats for a team in a year'''
+    def __fetch_event_matches(self, event: str) -> None:
+        '''
+        Fetch every match of an event with one request, conditional on the
+        cached list of them, and cache them along with the list
+        '''
+        self.__save_event_matches(event, FRCPy.__tba_request(
+            self.__tba_client.event_matches, self.__cache.get_last_modified('event_matches', (event,)),
+            event))
+
+    def __save_event_matches(self, event: str, result: tuple[list, str | None] | None) -> None:
+        '''
+        Cache the matches of an event fetched with one request along with the
+        list of them, or renew them when TBA reported them unchanged
+        '''
+        if result is None:
+            self.__cache.touch_event_matches(event)
+            if self.__cache.count_uncached_matches(event, FRCPy.__RENEWED) == 0:
+                return
+            # The list was cached without all of its matches, which are fetched in full
+            result = FRCPy.__tba_request(self.__tba_client.event_matches, None, event)
+        api_matches, last_modified = result
+        matches = [FRCPy.__match_from_api(match) for match in api_matches]
+        self.__cache.save_matches(matches, last_modified)
+        self.__cache.save_event_matches(event, sorted(match.key() for match in matches), last_modified)
+
+    def __event_schedule(self, event: str, cache_expiry: int) -> list[Match]:
+        '''Get every match in an event, fetched with one request unless they're all cached'''
+        expiry = self.__event_expiry(event, cache_expiry)
+        if self.__cache.count_uncached_matches(event, expiry) != 0:
+            self.__fetch_event_matches(event)
+            expiry = FRCPy.__RENEWED
+        return list(self.__cache.iter_event_matches(event, expiry))
+
+    def iter_matches(self, year: int, cache_expiry: int = 90) -> Iterator[Match]:
+        '''
+        Stream the matches in a year from the cache, event by event in order
+        of their start. The matches of events that aren't cached are fetched
+        a few events ahead in the background, so only those are held in
+        memory rather than the season.
+        '''
+        events = self.events_where(year, cache_expiry=cache_expiry)
+        with ThreadPoolExecutor(FRCPy.__PREFETCH_WORKERS) as executor:
+            fetches: dict[str, Future] = {}
+            ahead = 0
+            for event in events:
+                while ahead < len(events) and len(fetches) < FRCPy.__PREFETCH_WORKERS:
+                    upcoming = events[ahead]
+                    ahead += 1
+                    if self.__cache.count_uncached_matches(
+                            upcoming, self.__event_expiry(upcoming, cache_expiry)) != 0:
+                        # Workers have their own clients, as the consumer
+                        # may make conditional requests between matches, and
+                        # the cache is only used from this thread
+                        fetches[upcoming] = executor.submit(
+                            lambda event, last_modified: FRCPy.__tba_request(
+                                self.__worker_tba().event_matches, last_modified, event),
+                            upcoming, self.__cache.get_last_modified('event_matches', (upcoming,)))
+                expiry = self.__event_expiry(event, cache_expiry)
+                fetch = fetches.pop(event, None)
+                if fetch is not None:
+                    self.__save_event_matches(event, fetch.result())
+                    expiry = FRCPy.__RENEWED
+                yield from self.__cache.iter_event_matches(event, expiry)
+
+    def score_breakdown_table(self, year: int) -> StatsTable:
+        '''
+        Get the score breakdowns of the cached matches in a year as columns,
+        with a row for each alliance of each match
+        '''
+        table = self.__cache.get_score_breakdowns(year)
+        if table is None:
+            return StatsTable({}, 0)
+        return table
+
+    def elo(self, elo: Elo | None = None) -> Elo:
+        '''
+        Rate teams with the matches in the cache, updating `elo` with the
+        matches cached since it was last updated, or starting a new engine
+        '''
+        if elo is None:
+            elo = Elo()
+        elo.update(self.__cache)
+        return elo
+
+    def __event_results(self, event: str, qualifications_only: bool, cached: bool,
+                        cache_expiry: int) -> tuple[list[str], np.ndarray, np.ndarray]:
+        '''Returns the results of the played matches in an event for `opr`'''
         if cached:
-            stats = self.__cache.get_team_year_stats(team, year, cache_expiry)
-            if stats is not None:
-                return stats
-        stats = self.__statbotics_client.get_team_year(
-            Team.team_key_to_number(team), year
-        )
+            keys = self.event_matches(event, cached, cache_expiry)
+            expiry = self.__event_expiry(event, cache_expiry)
+            played = {result[6] for result in self.__cache.get_match_results(event=event)}
+            # Matches that were unplayed when cached are only refetched once they expire
+            if all(key in played or self.__cache.get_match(key, expiry) is not None for key in keys):
+                return opr.from_results(self.__cache.get_match_results(event=event),
+                                        qualifications_only)
+        # The full matches are fetched at once rather than one request per match
+        if cached:
+            self.__fetch_event_matches(event)
+            return opr.from_results(self.__cache.get_match_results(event=event), qualifications_only)
+        matches = [FRCPy.__match_from_api(match)
+                   for match in self.__tba_client.event_matches(event)]
+        return opr.from_matches(matches, qualifications_only)
+
+    def event_oprs(self, event: str, qualifications_only: bool = True, cached: bool = True,
+                   cache_expiry: int = 90) -> StatsTable:
+        '''
+        Get the OPR, DPR and CCWM of every team in an event as columns,
+        computed from its qualification matches or all of its matches
+        '''
+        keys, scores, teams = self.__event_results(event, qualifications_only, cached, cache_expiry)
+        fingerprint = opr.fingerprint(keys, scores, teams)
+        if cached:
+            ratings = self.__cache.get_event_oprs(event, qualifications_only, fingerprint)
+            if ratings is not None:
+                return ratings
+        ratings = opr.solve(scores, teams)
+        if cached:
+            self.__cache.save_event_oprs(event, qualifications_only, fingerprint, ratings)
+        return ratings
+
+    def incremental_oprs(self, event: str, oprs: opr.IncrementalOPR | None = None) -> opr.IncrementalOPR:
+        '''
+        Rate teams with the matches played in an event, updating `oprs` with
+        the matches played or corrected since it was last updated, or starting
+        a new state. The event's matches are fetched with one conditional
+        request each time, so results and matches added since are picked up.
+        '''
+        if oprs is None:
+            oprs = opr.IncrementalOPR()
+        self.__fetch_event_matches(event)
+        for match in self.__cache.iter_event_matches(event, FRCPy.__RENEWED):
+            oprs.ingest(match)
+        return oprs
 
+    def season_oprs(self, year: int, qualifications_only: bool = True,
+                    processes: int | None = None) -> dict[str, StatsTable]:
+        '''
+        Get the OPR, DPR and CCWM of every team in each event of a year with
+        cached matches. Events whose ratings aren't cached for their current
+        matches are solved on a pool of `processes` worker processes.
+        '''
+        events: dict[str, list[tuple]] = {}
+        for result in self.__cache.get_match_results(year=year):
+            events.setdefault(result[2], []).append(result)
+        ratings: dict[str, StatsTable] = {}
+        unsolved = []
+        for event, results in events.items():
+            keys, scores, teams = opr.from_results(results, qualifications_only)
+            fingerprint = opr.fingerprint(keys, scores, teams)
+            cached = self.__cache.get_event_oprs(event, qualifications_only, fingerprint)
+            if cached is not None:
+                ratings[event] = cached
+            else:
+                unsolved.append((event, fingerprint, scores, teams))
+        if processes == 1 or len(unsolved) < 2:
+            solved = [opr.solve(scores, teams) for _, _, scores, teams in unsolved]
+        else:
+            with ProcessPoolExecutor(processes) as executor:
+                solved = list(executor.map(opr.solve, [job[2] for job in unsolved],
+                                           [job[3] for job in unsolved], chunksize=8))
+        for (event, fingerprint, _, _), event_ratings in zip(unsolved, solved):
+            self.__cache.save_event_oprs(event, qualifications_only, fingerprint, event_ratings)
+            ratings[event] = event_ratings
+        return ratings
+
+    # Statbotics API provided data
+
+    @staticmethod
+    def __team_year_stats_from_api(team: str, year: int, stats: dict) -> TeamYearStats:
         epa_start = stats['epa_start']
         epa_pre_champs = stats['epa_pre_champs']
         epa_end = stats['epa_end']
@@ -337,7 +852,7 @@ class FRCPy:
         epa_rank = stats['total_epa_rank']
         epa_percent = stats['total_epa_percentile']
 
-        stats = TeamYearStats(
+        return TeamYearStats(
             team, year,
             epa_start, epa_pre_champs, epa_end, epa_mean, epa_max, epa_diff,
             auto_epa_start, auto_epa_pre_champs, auto_epa_end, auto_epa_mean, auto_epa_max,
@@ -349,22 +864,24 @@ class FRCPy:
             wins, losses, ties, count, winrate,
             epa_rank, epa_percent
         )
-        if cached:
-            self.__cache.save_team_year_stats(team, year, stats)
-        return stats
 
-    def team_event_stats(self, team: str, event: str, cached: bool = True,
-                         cache_expiry: int = 90) -> TeamEventStats:
-        '''Get the stats for a team in an event'''
+    def team_year_stats(self, team: str, year: int, cached: bool = True,
+                        cache_expiry: int = 90) -> TeamYearStats:
+        '''Get the stats for a team in a year'''
         if cached:
-            stats = self.__cache.get_team_event_stats(
-                team, event, cache_expiry)
+            stats = self.__cache.get_team_year_stats(
+                team, year, self.__year_expiry(year, cache_expiry))
             if stats is not None:
                 return stats
-        stats = self.__statbotics_client.get_team_event(
-            Team.team_key_to_number(team), event
-        )
+        stats = FRCPy.__team_year_stats_from_api(team, year, self.__statbotics_client.get_team_year(
+            Team.team_key_to_number(team), year
+        ))
+        if cached:
+            self.__cache.save_team_year_stats(team, year, stats)
+        return stats
 
+    @staticmethod
+    def __team_event_stats_from_api(team: str, event: str, stats: dict) -> TeamEventStats:
         epa_start = stats['epa_start']
         epa_pre_playoffs = stats['epa_pre_playoffs']
         epa_end = stats['epa_end']
@@ -404,13 +921,136 @@ class FRCPy:
         rank = stats['rank']
         num_teams = stats['num_teams']
 
-        stats = TeamEventStats(team, event, epa_start, epa_pre_playoffs, epa_end, epa_mean, epa_max, epa_diff, auto_epa_start, auto_epa_pre_playoffs, auto_epa_end, auto_epa_mean, auto_epa_max, teleop_epa_start, teleop_epa_pre_playoffs, teleop_epa_end, teleop_epa_mean, teleop_epa_max,
+        return TeamEventStats(team, event, epa_start, epa_pre_playoffs, epa_end, epa_mean, epa_max, epa_diff, auto_epa_start, auto_epa_pre_playoffs, auto_epa_end, auto_epa_mean, auto_epa_max, teleop_epa_start, teleop_epa_pre_playoffs, teleop_epa_end, teleop_epa_mean, teleop_epa_max,
                                endgame_epa_start, endgame_epa_pre_playoffs, endgame_epa_end, endgame_epa_mean, endgame_epa_max, rp_1_epa_start, rp_1_epa_end, rp_1_epa_mean, rp_1_epa_max, rp_2_epa_start, rp_2_epa_end, rp_2_epa_mean, rp_2_epa_max, wins, losses, ties, count, winrate, rps, rps_per_match, rank, num_teams)
 
+    def team_event_stats(self, team: str, event: str, cached: bool = True,
+                         cache_expiry: int = 90) -> TeamEventStats:
+        '''Get the stats for a team in an event'''
+        if cached:
+            stats = self.__cache.get_team_event_stats(
+                team, event, self.__event_expiry(event, cache_expiry))
+            if stats is not None:
+                return stats
+        stats = FRCPy.__team_event_stats_from_api(team, event, self.__statbotics_client.get_team_event(
+            Team.team_key_to_number(team), event
+        ))
         if cached:
             self.__cache.save_team_event_stats(team, event, stats)
         return stats
 
+    def __iter_statbotics_pages(self, fetch: Callable, **kwargs) -> Iterator[list[dict]]:
+        '''Fetch the pages of a Statbotics listing in turn, requesting the next in the background'''
+        with ThreadPoolExecutor(1) as executor:
+            offset = 0
+            page = executor.submit(fetch, limit=FRCPy.__STATBOTICS_PAGE, offset=offset, **kwargs)
+            while True:
+                results = page.result()
+                if len(results) < FRCPy.__STATBOTICS_PAGE:
+                    yield results
+                    return
+                offset += len(results)
+                page = executor.submit(fetch, limit=FRCPy.__STATBOTICS_PAGE, offset=offset, **kwargs)
+                yield results
+
+    def __statbotics_pages(self, fetch: Callable, **kwargs) -> list[dict]:
+        '''Fetch every page of a Statbotics listing'''
+        return list(chain.from_iterable(self.__iter_statbotics_pages(fetch, **kwargs)))
+
+    def team_year_stats_table(self, year: int, cached: bool = True,
+                              cache_expiry: int = 90) -> StatsTable:
+        '''Get the stats for every team in a year as columns'''
+        if cached:
+            table = self.__cache.get_year_stats(year, self.__year_expiry(year, cache_expiry))
+            if table is not None:
+                return table
+        stats = [
+            FRCPy.__team_year_stats_from_api(f"frc{team_stats['team']}", year, team_stats)
+            for team_stats in self.__statbotics_pages(
+                self.__statbotics_client.get_team_years, year=year)
+        ]
+        if cached:
+            self.__cache.save_year_stats(year, stats)
+            table = self.__cache.get_year_stats(year, FRCPy.__RENEWED)
+            if table is not None:
+                return table
+        stats.sort(key=lambda team_stats: Team.team_key_to_number(team_stats.team_key()))
+        return StatsTable.from_models(stats)
+
+    def iter_team_year_stats(self, year: int, cache_expiry: int = 90) -> Iterator[TeamYearStats]:
+        '''
+        Stream the stats for every team in a year from the cache in order of
+        team number. Unless the year is cached the stats are fetched and
+        cached a page at a time, so only a page or two is held in memory.
+        '''
+        expiry = self.__year_expiry(year, cache_expiry)
+        if not self.__cache.has_year_stats(year, expiry):
+            count = 0
+            for page in self.__iter_statbotics_pages(
+                    self.__statbotics_client.get_team_years, year=year):
+                self.__cache.save_many_team_year_stats([
+                    FRCPy.__team_year_stats_from_api(f"frc{team_stats['team']}", year, team_stats)
+                    for team_stats in page
+                ])
+                count += len(page)
+            self.__cache.save_year_stats_count(year, count)
+            expiry = FRCPy.__RENEWED
+        yield from self.__cache.iter_team_year_stats(year, expiry)
+
+    def event_stats_table(self, event: str, cached: bool = True,
+                          cache_expiry: int = 90) -> StatsTable:
+        '''Get the stats for every team in an event as columns'''
+        if cached:
+            table = self.__cache.get_event_stats(event, self.__event_expiry(event, cache_expiry))
+            if table is not None:
+                return table
+        stats = [
+            FRCPy.__team_event_stats_from_api(f"frc{team_stats['team']}", event, team_stats)
+            for team_stats in self.__statbotics_pages(
+                self.__statbotics_client.get_team_events, event=event)
+        ]
+        if cached:
+            self.__cache.save_event_stats(event, stats)
+            table = self.__cache.get_event_stats(event, FRCPy.__RENEWED)
+            if table is not None:
+                return table
+        stats.sort(key=lambda team_stats: Team.team_key_to_number(team_stats.team_key()))
+        return StatsTable.from_models(stats)
+
+    def simulate_rankings(self, event: str, simulations: int = 10000, processes: int | None = 1,
+                          seed: int | None = None, cache_expiry: int = 90) -> Rankings:
+        '''
+        Simulate the remaining qualification matches of an event from its
+        teams' Statbotics EPAs, returning the distribution of its rankings
+        '''
+        schedule = self.__event_schedule(event, cache_expiry)
+        ratings = self.event_stats_table(event, cache_expiry=cache_expiry)
+        return RankingSimulator(schedule, ratings).run(simulations, processes, seed)
+
+    def simulate_playoffs(self, event: str, alliances: list[list[str]], simulations: int = 100000,
+                          seed: int | None = None, cache_expiry: int = 90) -> StatsTable:
+        '''
+        Simulate the playoff bracket of an event with the given alliances in
+        seed order, returning each alliance's chance of winning each round
+        '''
+        probabilities = win_probabilities(
+            alliances, self.event_stats_table(event, cache_expiry=cache_expiry))
+        return BracketSimulator.for_event(
+            self.event(event, cache_expiry=cache_expiry), probabilities).simulate(simulations, seed)
+
+    def evaluate_picks(self, event: str, rankings: list[str], captain: str,
+                       made: list[str] | None = None, processes: int | None = 1,
+                       cache_expiry: int = 90) -> StatsTable:
+        '''
+        Score each team available to a captain on its next pick of alliance
+        selection by its alliance's chance of winning the playoffs, given the
+        event's qualification rankings and the picks already made
+        '''
+        selection = AllianceSelection.for_event(
+            self.event(event, cache_expiry=cache_expiry), rankings,
+            self.event_stats_table(event, cache_expiry=cache_expiry))
+        return selection.evaluate(captain, made, processes=processes)
+
     # Google Maps API provided data
     def _geocode(self, string: str) -> tuple[float, float, str, str, str] | None:
         geocoded = self.__gmaps_client.geocode(string)
@@ -3,12 +3,30 @@ Classes for the models in this library.
 '''
 from datetime import datetime
 import json
+import math
+import sys
+import numpy as np
+from . import serialization
+
+
+def _to_iso(timestamp: datetime | None) -> str | None:
+    return None if timestamp is None else timestamp.isoformat()
+
+
+def _from_iso(timestamp: str | None) -> datetime | None:
+    return None if timestamp is None else datetime.fromisoformat(timestamp)
+
+
+def _intern(value: str | None) -> str | None:
+    # Subclasses of str such as numpy.str_ can't be interned, they're converted first
+    return sys.intern(str(value)) if isinstance(value, str) else value
 
 
 class Location:
     '''
     Represents a team or event's location.
     '''
+    __slots__ = ('__city', '__state_prov', '__country')
 
     def __init__(self, city: str, state_prov: str, country: str):
         self.__city = city
@@ -31,11 +49,27 @@ class Location:
         '''Returns a string representation of this location'''
         return f"{self.__city, self.__state_prov, self.__country}"
 
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of this location'''
+        return {
+            'city': self.__city,
+            'state_prov': self.__state_prov,
+            'country': self.__country
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Location':
+        '''Creates a location from its dictionary representation'''
+        return Location(data['city'], data['state_prov'], data['country'])
+
 
 class PreciseLocation:
     '''
     Represents the precise location of a team or event.
     '''
+    __slots__ = (
+        '__location', '__latitude', '__longitude', '__address', '__postal_code', '__place_id'
+    )
 
     def __init__(self, location: Location, latitude: float, longitude: float,
                  address: str, postal_code: str | None, place_id: str):
@@ -74,19 +108,47 @@ class PreciseLocation:
         '''Returns a tuple of latitude and longitude of this precise location'''
         return self.__latitude, self.__longitude
 
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of this precise location'''
+        return {
+            'location': self.__location.to_dict(),
+            'latitude': self.__latitude,
+            'longitude': self.__longitude,
+            'address': self.__address,
+            'postal_code': self.__postal_code,
+            'place_id': self.__place_id
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'PreciseLocation':
+        '''Creates a precise location from its dictionary representation'''
+        return PreciseLocation(Location.from_dict(data['location']),
+                               data['latitude'], data['longitude'],
+                               data['address'], data['postal_code'], data['place_id'])
+
 
 class Team:
     '''
     Represents a team
     '''
+    __slots__ = (
+        '__key', '__nickname', '__name', '__location', '__school_name', '__website',
+        '__rookie_year', '__motto'
+    )
+
     @staticmethod
     def team_key_to_number(team_key: str) -> int:
         '''Converts a team key to a team number'''
         return int(team_key[3:])
 
+    @staticmethod
+    def team_number_to_key(team_number: int) -> str:
+        '''Converts a team number to a team key'''
+        return sys.intern(f"frc{team_number}")
+
     def __init__(self, key: str, nickname: str, name: str, location: Location,
                  school_name: str, website: str, rookie_year: str, motto: str):
-        self.__key = key
+        self.__key = _intern(key)
         self.__nickname = nickname
         self.__name = name
         self.__location = location
@@ -127,11 +189,42 @@ class Team:
         '''Returns the motto of this team'''
         return self.__motto
 
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of this team'''
+        return {
+            'key': self.__key,
+            'nickname': self.__nickname,
+            'name': self.__name,
+            'location': self.__location.to_dict(),
+            'school_name': self.__school_name,
+            'website': self.__website,
+            'rookie_year': self.__rookie_year,
+            'motto': self.__motto
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Team':
+        '''Creates a team from its dictionary representation'''
+        return Team(data['key'], data['nickname'], data['name'], Location.from_dict(data['location']),
+                    data['school_name'], data['website'], data['rookie_year'], data['motto'])
+
 
 class TeamYearStats:
     '''
     Represents a team's statistics for a single year
     '''
+    __slots__ = (
+        '__team_key', '__year', '__epa_start', '__epa_pre_champs', '__epa_end', '__epa_mean',
+        '__epa_max', '__epa_diff', '__auto_epa_start', '__auto_epa_pre_champs',
+        '__auto_epa_end', '__auto_epa_mean', '__auto_epa_max', '__teleop_epa_start',
+        '__teleop_epa_pre_champs', '__teleop_epa_end', '__teleop_epa_mean', '__teleop_epa_max',
+        '__endgame_epa_start', '__endgame_epa_pre_champs', '__endgame_epa_end',
+        '__endgame_epa_mean', '__endgame_epa_max', '__rp_1_epa_start', '__rp_1_epa_pre_champs',
+        '__rp_1_epa_end', '__rp_1_epa_mean', '__rp_1_epa_max', '__rp_2_epa_start',
+        '__rp_2_epa_pre_champs', '__rp_2_epa_end', '__rp_2_epa_mean', '__rp_2_epa_max',
+        '__norm_epa_end', '__wins', '__losses', '__ties', '__count', '__winrate', '__epa_rank',
+        '__epa_percent'
+    )
 
     def __init__(self, team_key: str, year: int,
                  epa_start: float, epa_pre_champs: float, epa_end: float,
@@ -145,7 +238,7 @@ class TeamYearStats:
                  wins: int, losses: int, ties: int, count: int, winrate: float,
                  epa_rank: float, epa_percent: float
                  ) -> None:
-        self.__team_key = team_key
+        self.__team_key = _intern(team_key)
         self.__year = year
         self.__epa_start = epa_start
         self.__epa_pre_champs = epa_pre_champs
@@ -317,11 +410,32 @@ class TeamYearStats:
     def epa_percent(self) -> float:
         return self.__epa_percent
 
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of these stats'''
+        # The slots are declared in the order of the constructor arguments
+        return {slot[2:]: getattr(self, slot[2:])() for slot in TeamYearStats.__slots__}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'TeamYearStats':
+        '''Creates stats from their dictionary representation'''
+        return TeamYearStats(*(data[slot[2:]] for slot in TeamYearStats.__slots__))
+
 
 class TeamEventStats:
     '''
     Represents a team's statistics for a single event
     '''
+    __slots__ = (
+        '__team_key', '__event_key', '__epa_start', '__epa_pre_playoffs', '__epa_end',
+        '__epa_mean', '__epa_max', '__epa_diff', '__auto_epa_start', '__auto_epa_pre_playoffs',
+        '__auto_epa_end', '__auto_epa_mean', '__auto_epa_max', '__teleop_epa_start',
+        '__teleop_epa_pre_playoffs', '__teleop_epa_end', '__teleop_epa_mean',
+        '__teleop_epa_max', '__endgame_epa_start', '__endgame_epa_pre_playoffs',
+        '__endgame_epa_end', '__endgame_epa_mean', '__endgame_epa_max', '__rp_1_epa_start',
+        '__rp_1_epa_end', '__rp_1_epa_mean', '__rp_1_epa_max', '__rp_2_epa_start',
+        '__rp_2_epa_end', '__rp_2_epa_mean', '__rp_2_epa_max', '__wins', '__losses', '__ties',
+        '__count', '__winrate', '__rps', '__rps_per_match', '__rank', '__num_teams'
+    )
 
     def __init__(self, team_key: str, event_key: str,
                  epa_start: float, epa_pre_playoffs: float, epa_end: float,
@@ -334,7 +448,7 @@ class TeamEventStats:
                  wins: int, losses: int, ties: int, count: int, winrate: float,
                  rps: int, rps_per_match: float, rank: int, num_teams: int
                  ) -> None:
-        self.__team_key = team_key
+        self.__team_key = _intern(team_key)
         self.__event_key = event_key
         self.__epa_start = epa_start
         self.__epa_pre_playoffs = epa_pre_playoffs
@@ -497,11 +611,22 @@ class TeamEventStats:
     def num_teams(self) -> int:
         return self.__num_teams
 
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of these stats'''
+        # The slots are declared in the order of the constructor arguments
+        return {slot[2:]: getattr(self, slot[2:])() for slot in TeamEventStats.__slots__}
+
+    @staticmethod
+    def from_dict(data: dict) -> 'TeamEventStats':
+        '''Creates stats from their dictionary representation'''
+        return TeamEventStats(*(data[slot[2:]] for slot in TeamEventStats.__slots__))
+
 
 class Webcast:
     '''
     Represents a webcast
     '''
+    __slots__ = ('__type', '__channel', '__date', '__file')
 
     def __init__(self, webcast_type: str, channel: str, date: str, file: str):
         self.__type = webcast_type
@@ -529,20 +654,37 @@ class Webcast:
         '''Returns a string representation of this webcast'''
         return f"{self.__type, self.__channel, self.__date, self.__file}"
 
-    def to_json(self) -> str:
-        '''Returns a JSON representation of this webcast'''
-        return json.dumps({
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of this webcast'''
+        return {
             'type': self.__type,
             'channel': self.__channel,
             'date': self.__date,
             'file': self.__file
-        })
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Webcast':
+        '''Creates a webcast from its dictionary representation'''
+        return Webcast(data['type'], data['channel'], data['date'], data['file'])
+
+    def to_json(self) -> str:
+        '''Returns a JSON representation of this webcast'''
+        return json.dumps(self.to_dict())
 
 
 class Event:
     '''
-    Represents an event
+    Represents an event. The dates, webcasts and divisions may be given as
+    read from the cache, they are decoded when first accessed.
     '''
+    __slots__ = (
+        '__key', '__name', '__location', '__type', '__dates', '__district_key', '__short_name',
+        '__week', '__location_name', '__precise_location', '__timezone', '__website',
+        '__first_event_id', '__first_event_code', '__webcasts', '__divisions',
+        '__parent_event_key', '__playoff_type'
+    )
+
     @staticmethod
     def event_key_to_year(event_key: str) -> int:
         '''Converts an event key to an event year'''
@@ -655,6 +797,9 @@ class Event:
 
     def dates(self) -> tuple[datetime, datetime]:
         '''Returns the dates of this event'''
+        if isinstance(self.__dates[0], int):
+            start, end = self.__dates
+            self.__dates = (datetime.utcfromtimestamp(start), datetime.utcfromtimestamp(end))
         return self.__dates
 
     def district_key(self) -> str:
@@ -695,10 +840,15 @@ class Event:
 
     def webcasts(self) -> list[Webcast]:
         '''Returns the webcasts of this event'''
+        if isinstance(self.__webcasts, str):
+            self.__webcasts = [Webcast.from_dict(webcast)
+                               for webcast in serialization.loads(self.__webcasts)]
         return self.__webcasts
 
     def divisions(self) -> list[str]:
         '''Returns the divisions of this event'''
+        if isinstance(self.__divisions, str):
+            self.__divisions = serialization.loads(self.__divisions)
         return self.__divisions
 
     def parent_event_key(self) -> str:
@@ -745,16 +895,57 @@ class Event:
             'Double Elimination Bracket (8 Alliances)'
         }
 
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of this event'''
+        start, end = self.dates()
+        return {
+            'key': self.__key,
+            'name': self.__name,
+            'location': self.__location.to_dict(),
+            'type': self.__type,
+            'dates': [_to_iso(start), _to_iso(end)],
+            'district_key': self.__district_key,
+            'short_name': self.__short_name,
+            'week': self.__week,
+            'precise_location': self.__precise_location.to_dict(),
+            'location_name': self.__location_name,
+            'timezone': self.__timezone,
+            'website': self.__website,
+            'first_event_id': self.__first_event_id,
+            'first_event_code': self.__first_event_code,
+            'webcasts': [webcast.to_dict() for webcast in self.webcasts()],
+            'divisions': self.divisions(),
+            'parent_event_key': self.__parent_event_key,
+            'playoff_type': self.__playoff_type
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Event':
+        '''Creates an event from its dictionary representation'''
+        start, end = data['dates']
+        return Event(
+            data['key'], data['name'], Location.from_dict(data['location']), data['type'],
+            (_from_iso(start), _from_iso(end)),
+            data['district_key'], data['short_name'], data['week'],
+            PreciseLocation.from_dict(data['precise_location']),
+            data['location_name'], data['timezone'],
+            data['website'], data['first_event_id'], data['first_event_code'],
+            [Webcast.from_dict(webcast) for webcast in data['webcasts']],
+            data['divisions'], data['parent_event_key'], data['playoff_type']
+        )
+
 
 class MatchAlliance:
     '''
     Represents an alliance in a match
     '''
+    __slots__ = ('__teams', '__dq', '__surrogate')
 
     def __init__(self, teams: list[str], disqualified: list[str], surrogate: list[str]):
-        self.__teams = teams
-        self.__dq = disqualified
-        self.__surrogate = surrogate
+        # Team keys are interned, as the same few thousand repeat across every match
+        self.__teams = [_intern(team) for team in teams]
+        self.__dq = [_intern(team) for team in disqualified]
+        self.__surrogate = [_intern(team) for team in surrogate]
 
     def teams(self) -> list[str]:
         '''Returns the teams in this alliance'''
@@ -772,19 +963,29 @@ class MatchAlliance:
         '''Returns a string representation of this alliance'''
         return f"{self.__teams, self.__dq, self.__surrogate}"
 
-    def to_json(self) -> str:
-        '''Returns a JSON representation of this alliance'''
-        return json.dumps({
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of this alliance'''
+        return {
             'teams': self.__teams,
             'dq': self.__dq,
             'surrogate': self.__surrogate
-        })
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'MatchAlliance':
+        '''Creates an alliance from its dictionary representation'''
+        return MatchAlliance(data['teams'], data['dq'], data['surrogate'])
+
+    def to_json(self) -> str:
+        '''Returns a JSON representation of this alliance'''
+        return json.dumps(self.to_dict())
 
 
 class MatchVideo:
     '''
     Represents a video of a match
     '''
+    __slots__ = ('__type', '__key')
 
     def __init__(self, video_type: str, key: str):
         self.__type = video_type
@@ -802,18 +1003,34 @@ class MatchVideo:
         '''Returns a string representation of this video'''
         return f"{self.__type, self.__key}"
 
-    def to_json(self) -> str:
-        '''Returns a JSON representation of this video'''
-        return json.dumps({
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of this video'''
+        return {
             'type': self.__type,
             'key': self.__key
-        })
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'MatchVideo':
+        '''Creates a video from its dictionary representation'''
+        return MatchVideo(data['type'], data['key'])
+
+    def to_json(self) -> str:
+        '''Returns a JSON representation of this video'''
+        return json.dumps(self.to_dict())
 
 
 class Match:
     '''
-    Represents a match
+    Represents a match. The alliances, times and videos may be given as read
+    from the cache, they are decoded when first accessed.
     '''
+    __slots__ = (
+        '__key', '__level', '__set_number', '__match_number', '__red_score', '__blue_score',
+        '__red_teams', '__blue_teams', '__winner', '__schedule_time', '__predicted_time',
+        '__actual_time', '__result_time', '__videos', '__score_breakdown'
+    )
+
     @staticmethod
     def match_key_to_year(match_key: str) -> int:
         '''Converts a match key to a year'''
@@ -830,7 +1047,7 @@ class Match:
                  winner: str,
                  schedule_time: datetime, predicted_time: datetime,
                  actual_time: datetime, result_time: datetime,
-                 videos=list[MatchVideo]):
+                 videos=list[MatchVideo], score_breakdown: dict[str, dict] | None = None):
         self.__key = key
         self.__level = level
         self.__set_number = set_number
@@ -845,7 +1062,7 @@ class Match:
         self.__actual_time = actual_time
         self.__result_time = result_time
         self.__videos = videos
-        # TODO: Add score breakdowns
+        self.__score_breakdown = score_breakdown
 
     def key(self) -> str:
         '''Returns the key of this match'''
@@ -879,10 +1096,14 @@ class Match:
 
     def red_teams(self) -> MatchAlliance:
         '''Returns the red alliance of this match'''
+        if isinstance(self.__red_teams, str):
+            self.__red_teams = MatchAlliance.from_dict(serialization.loads(self.__red_teams))
         return self.__red_teams
 
     def blue_teams(self) -> MatchAlliance:
         '''Returns the blue alliance of this match'''
+        if isinstance(self.__blue_teams, str):
+            self.__blue_teams = MatchAlliance.from_dict(serialization.loads(self.__blue_teams))
         return self.__blue_teams
 
     def winner(self) -> str:
@@ -891,20 +1112,139 @@ class Match:
 
     def schedule_time(self) -> datetime:
         '''Returns the schedule time of this match'''
+        if isinstance(self.__schedule_time, int):
+            self.__schedule_time = datetime.fromtimestamp(self.__schedule_time)
         return self.__schedule_time
 
     def predicted_time(self) -> datetime:
         '''Returns the predicted time of this match'''
+        if isinstance(self.__predicted_time, int):
+            self.__predicted_time = datetime.fromtimestamp(self.__predicted_time)
         return self.__predicted_time
 
     def actual_time(self) -> datetime:
         '''Returns the actual time of this match'''
+        if isinstance(self.__actual_time, int):
+            self.__actual_time = datetime.fromtimestamp(self.__actual_time)
         return self.__actual_time
 
     def result_time(self) -> datetime:
         '''Returns the result time of this match'''
+        if isinstance(self.__result_time, int):
+            self.__result_time = datetime.fromtimestamp(self.__result_time)
         return self.__result_time
 
     def videos(self) -> list[MatchVideo]:
         '''Returns the videos of this match'''
+        if isinstance(self.__videos, str):
+            self.__videos = [MatchVideo.from_dict(video) for video in serialization.loads(self.__videos)]
         return self.__videos
+
+    def score_breakdown(self) -> dict[str, dict] | None:
+        '''
+        Returns the score breakdown of each alliance of this match, keyed by
+        'red' and 'blue', the fields depend on the season's game
+        '''
+        return self.__score_breakdown
+
+    def to_dict(self) -> dict:
+        '''Returns a dictionary representation of this match'''
+        return {
+            'key': self.__key,
+            'level': self.__level,
+            'set_number': self.__set_number,
+            'match_number': self.__match_number,
+            'red_score': self.__red_score,
+            'blue_score': self.__blue_score,
+            'red_teams': self.red_teams().to_dict(),
+            'blue_teams': self.blue_teams().to_dict(),
+            'winner': self.__winner,
+            'schedule_time': _to_iso(self.schedule_time()),
+            'predicted_time': _to_iso(self.predicted_time()),
+            'actual_time': _to_iso(self.actual_time()),
+            'result_time': _to_iso(self.result_time()),
+            'videos': [video.to_dict() for video in self.videos()],
+            'score_breakdown': self.__score_breakdown
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> 'Match':
+        '''Creates a match from its dictionary representation'''
+        return Match(
+            data['key'], data['level'], data['set_number'], data['match_number'],
+            data['red_score'], data['blue_score'],
+            MatchAlliance.from_dict(data['red_teams']), MatchAlliance.from_dict(data['blue_teams']),
+            data['winner'],
+            _from_iso(data['schedule_time']), _from_iso(data['predicted_time']),
+            _from_iso(data['actual_time']), _from_iso(data['result_time']),
+            [MatchVideo.from_dict(video) for video in data['videos']],
+            data.get('score_breakdown')
+        )
+
+
+class StatsTable:
+    '''
+    Represents statistics as columns, numeric columns are numpy arrays with
+    missing values stored as NaN and other columns are lists. Tables of team stats identify teams by both their
+    `team_key` and integer `team_number`.
+    '''
+    __slots__ = ('__columns', '__length')
+
+    @staticmethod
+    def from_rows(names: list[str], numeric: list[bool], rows) -> 'StatsTable':
+        '''Builds a table from rows of values in the order of `names`'''
+        columns: list[list] = [[] for _ in names]
+        length = 0
+        for row in rows:
+            for column, value in zip(columns, row):
+                column.append(_intern(value))
+            length += 1
+        return StatsTable({
+            name: StatsTable.__numeric(column) if is_numeric else column
+            for name, column, is_numeric in zip(names, columns, numeric)
+        }, length)
+
+    @staticmethod
+    def __numeric(values: list) -> np.ndarray:
+        # Integer columns holding fractions or missing values are widened
+        if all(isinstance(value, int) for value in values):
+            return np.array(values, dtype=np.int64)
+        return np.array([math.nan if value is None else value for value in values], dtype=np.float64)
+
+    @staticmethod
+    def from_models(models: list) -> 'StatsTable':
+        '''Builds a table from a list of TeamYearStats or TeamEventStats'''
+        if len(models) == 0:
+            return StatsTable({}, 0)
+        names = [slot[2:] for slot in type(models[0]).__slots__]
+        rows = ([*(getattr(model, name)() for name in names),
+                 Team.team_key_to_number(model.team_key())] for model in models)
+        numeric = [not name.endswith('_key') for name in names] + [True]
+        return StatsTable.from_rows(names + ['team_number'], numeric, rows)
+
+    def __init__(self, columns: dict[str, np.ndarray | list], length: int):
+        self.__columns = columns
+        self.__length = length
+
+    def columns(self) -> list[str]:
+        '''Returns the names of the columns in this table'''
+        return list(self.__columns)
+
+    def column(self, name: str) -> np.ndarray | list:
+        '''Returns a column of this table'''
+        return self.__columns[name]
+
+    def __getitem__(self, name: str) -> np.ndarray | list:
+        return self.__columns[name]
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __str__(self) -> str:
+        '''Returns a string representation of this table'''
+        return f"{self.__length, self.columns()}"
+
+    def to_pandas(self):
+        '''Returns this table as a pandas DataFrame, pandas must be installed'''
+        import pandas  # pylint: disable=import-outside-toplevel
+        return pandas.DataFrame(self.__columns)
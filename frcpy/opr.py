@@ -0,0 +1,190 @@
+'''
+Offensive and defensive power ratings computed from match results
+'''
+import hashlib
+import numpy as np
+from .models import Match, StatsTable, Team
+
+
+def from_results(results: list[tuple], qualifications_only: bool = True
+                 ) -> tuple[list[str], np.ndarray, np.ndarray]:
+    '''
+    Returns the keys, red and blue scores, and red and blue team numbers of
+    match results read with `Cache.get_match_results`
+    '''
+    if qualifications_only:
+        results = [result for result in results if result[3] == 0]
+    keys = [result[6] for result in results]
+    numbers = np.array([result[7:] for result in results], dtype=np.int64).reshape(-1, 8)
+    return keys, numbers[:, :2], numbers[:, 2:]
+
+
+def from_matches(matches: list[Match], qualifications_only: bool = True
+                 ) -> tuple[list[str], np.ndarray, np.ndarray]:
+    '''
+    Returns the keys, red and blue scores, and red and blue team numbers of
+    the played matches in a list of matches
+    '''
+    keys = []
+    rows = []
+    for match in matches:
+        if match.red_score() < 0 or match.blue_score() < 0:
+            continue
+        if qualifications_only and not match.is_qualification():
+            continue
+        stations = []
+        for alliance in (match.red_teams(), match.blue_teams()):
+            # Early seasons had two teams per alliance, empty stations are 0
+            numbers = [Team.team_key_to_number(team) for team in alliance.teams()][:3]
+            stations += numbers + [0] * (3 - len(numbers))
+        keys.append(match.key())
+        rows.append([match.red_score(), match.blue_score(), *stations])
+    numbers = np.array(rows, dtype=np.int64).reshape(-1, 8)
+    return keys, numbers[:, :2], numbers[:, 2:]
+
+
+def fingerprint(keys: list[str], scores: np.ndarray, teams: np.ndarray) -> str:
+    '''Returns a digest identifying a set of match results regardless of their order'''
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update('\n'.join(keys[i] for i in order).encode())
+    digest.update(np.ascontiguousarray(scores[order], dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(teams[order], dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def table(numbers: np.ndarray, opr: np.ndarray, dpr: np.ndarray) -> StatsTable:
+    '''Returns the ratings of teams as columns, ordered by team number'''
+    return StatsTable({
+        'team_key': [Team.team_number_to_key(number) for number in numbers.tolist()],
+        'team_number': numbers,
+        'opr': opr,
+        'dpr': dpr,
+        'ccwm': opr - dpr
+    }, len(numbers))
+
+
+def solve(scores: np.ndarray, teams: np.ndarray) -> StatsTable:
+    '''
+    Rate the teams in a set of match results. A team's OPR is its least
+    squares contribution to its alliances' scores, its DPR its contribution to
+    their opponents' scores, and its CCWM the difference of the two.
+    '''
+    numbers, index = np.unique(teams, return_inverse=True)
+    index = index.reshape(teams.shape)
+    size = len(numbers)
+    # Each alliance is a row of the design matrix with a 1 for each of its
+    # teams, the normal equations are accumulated from the team indices
+    # without forming it
+    alliances = np.concatenate([index[:, :3], index[:, 3:]])
+    pairs = np.repeat(alliances, 3, axis=1).ravel() * size + np.tile(alliances, (1, 3)).ravel()
+    normal = np.bincount(pairs, minlength=size * size).reshape(size, size).astype(np.float64)
+    targets = np.concatenate([scores, scores[:, ::-1]]).astype(np.float64)
+    products = np.zeros((size, 2), dtype=np.float64)
+    np.add.at(products, alliances.ravel(), np.repeat(targets, 3, axis=0))
+    if size > 0 and numbers[0] == 0:
+        # The empty station isn't a team
+        numbers, normal, products = numbers[1:], normal[1:, 1:], products[1:]
+    if len(numbers) == 0:
+        return table(numbers, np.zeros(0), np.zeros(0))
+    # Least squares handles teams whose ratings aren't determined yet, as
+    # early in an event, with the minimum norm solution
+    solution = np.linalg.lstsq(normal, products, rcond=None)[0]
+    return table(numbers, solution[:, 0], solution[:, 1])
+
+
+class IncrementalOPR:
+    '''
+    Rates the teams in an event one match at a time. The normal equations
+    are kept as a Cholesky factor that each alliance updates in place, so a
+    match costs a rank one update per alliance rather than a new solve.
+
+    A small ridge term keeps the factor positive definite while ratings are
+    still undetermined early in the event, it's negligible once every team
+    has played a few matches.
+    '''
+
+    def __init__(self, qualifications_only: bool = True, ridge: float = 1e-9):
+        self.__qualifications_only = qualifications_only
+        self.__ridge = ridge
+        self.__numbers: list[int] = []
+        self.__index: dict[int, int] = {}
+        self.__factor = np.zeros((0, 0), dtype=np.float64)
+        self.__products = np.zeros((0, 2), dtype=np.float64)
+        # Rows ingested for each match, so a corrected result can replace them
+        self.__matches: dict[str, list[tuple[list[int], float, float]]] = {}
+
+    def ingest(self, match: Match) -> bool:
+        '''
+        Update the ratings with a played match, returning whether they
+        changed. A match that was already ingested is replaced if its result
+        has since been corrected.
+        '''
+        keys, scores, teams = from_matches([match], self.__qualifications_only)
+        if len(keys) == 0:
+            return False
+        rows = []
+        for alliance, own, against in ((teams[0, :3], scores[0, 0], scores[0, 1]),
+                                       (teams[0, 3:], scores[0, 1], scores[0, 0])):
+            rows.append(([self.__team(number) for number in alliance.tolist() if number != 0],
+                         float(own), float(against)))
+        previous = self.__matches.get(match.key())
+        if previous == rows:
+            return False
+        if previous is not None:
+            for indices, own, against in previous:
+                self.__add(indices, own, against, -1)
+        for indices, own, against in rows:
+            self.__add(indices, own, against, 1)
+        self.__matches[match.key()] = rows
+        return True
+
+    def matches(self) -> int:
+        '''Returns the number of matches ingested'''
+        return len(self.__matches)
+
+    def has_match(self, match_key: str) -> bool:
+        '''Returns whether a match has been ingested'''
+        return match_key in self.__matches
+
+    def snapshot(self) -> StatsTable:
+        '''Returns the current OPR, DPR and CCWM of every team as columns'''
+        numbers = np.array(self.__numbers, dtype=np.int64)
+        if len(numbers) == 0:
+            return table(numbers, np.zeros(0), np.zeros(0))
+        # Forward and back substitution with the factor, by NumPy's solver
+        solution = np.linalg.solve(self.__factor.T, np.linalg.solve(self.__factor, self.__products))
+        order = np.argsort(numbers)
+        return table(numbers[order], solution[order, 0], solution[order, 1])
+
+    def __team(self, number: int) -> int:
+        '''Returns the index of a team, adding it with no matches if it's new'''
+        index = self.__index.get(number)
+        if index is not None:
+            return index
+        index = len(self.__numbers)
+        self.__numbers.append(number)
+        self.__index[number] = index
+        factor = np.zeros((index + 1, index + 1), dtype=np.float64)
+        factor[:index, :index] = self.__factor
+        factor[index, index] = np.sqrt(self.__ridge)
+        self.__factor = factor
+        self.__products = np.concatenate([self.__products, np.zeros((1, 2))])
+        return index
+
+    def __add(self, indices: list[int], own: float, against: float, sign: int) -> None:
+        '''Add or, with a negative sign, remove an alliance's row of the design matrix'''
+        self.__products[indices] += sign * np.array([own, against])
+        row = np.zeros(len(self.__numbers), dtype=np.float64)
+        row[indices] = 1
+        factor = self.__factor
+        # Entries before the first team of the row are unchanged
+        for k in range(min(indices), len(row)):
+            if row[k] == 0:
+                continue
+            diagonal = np.sqrt(factor[k, k] ** 2 + sign * row[k] ** 2)
+            cosine = diagonal / factor[k, k]
+            sine = row[k] / factor[k, k]
+            factor[k, k] = diagonal
+            factor[k + 1:, k] = (factor[k + 1:, k] + sign * sine * row[k + 1:]) / cosine
+            row[k + 1:] = cosine * row[k + 1:] - sine * factor[k + 1:, k]
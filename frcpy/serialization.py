@@ -0,0 +1,24 @@
+'''
+Serialization of the nested fields stored in the cache
+'''
+from typing import Any
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the standard library is used without it
+    orjson = None
+
+
+def dumps(data: Any) -> str:
+    '''Serializes data to compact JSON'''
+    if orjson is not None:
+        return orjson.dumps(data).decode()
+    return json.dumps(data, separators=(',', ':'))
+
+
+def loads(data: str) -> Any:
+    '''Deserializes JSON'''
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
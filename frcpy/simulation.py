@@ -0,0 +1,566 @@
+'''
+Monte Carlo simulations of events
+'''
+from concurrent.futures import ProcessPoolExecutor
+import math
+import os
+from typing import Callable
+import numpy as np
+from .models import Event, Match, StatsTable, Team
+
+
+def _columns(teams: list[str], ratings: StatsTable, names: tuple[str, ...]) -> list[np.ndarray]:
+    '''
+    Returns columns of `ratings` in the order of `teams`, teams without
+    ratings are given the mean of the others
+    '''
+    rows = {team: i for i, team in enumerate(ratings['team_key'])} if len(ratings) > 0 else {}
+    columns = []
+    for name in names:
+        column = np.full(len(teams), np.nan)
+        if len(ratings) > 0:
+            values = np.asarray(ratings[name], dtype=np.float64)
+            for i, team in enumerate(teams):
+                if team in rows:
+                    column[i] = values[rows[team]]
+        known = column[~np.isnan(column)]
+        column[np.isnan(column)] = known.mean() if len(known) > 0 else 0
+        columns.append(column)
+    return columns
+
+
+def _variances(teams: list[str], epa: np.ndarray, deviation: float,
+               deviations: dict[str, float] | None) -> np.ndarray:
+    '''Returns the variance of each team's contribution to its alliance's score'''
+    spread = np.full(len(teams), deviation * epa.mean() if len(teams) > 0 else 0)
+    index = {team: i for i, team in enumerate(teams)}
+    for team, team_deviation in (deviations or {}).items():
+        if team in index:
+            spread[index[team]] = team_deviation
+    return spread ** 2
+
+
+class Rankings:
+    '''
+    Distribution of an event's qualification rankings over a number of
+    simulations. Distributions of the same event from separate runs can be
+    combined with `merge`.
+    '''
+
+    def __init__(self, teams: list[str], rank_counts: np.ndarray,
+                 ranking_point_counts: np.ndarray, simulations: int):
+        self.__teams = teams
+        self.__rank_counts = rank_counts
+        self.__ranking_point_counts = ranking_point_counts
+        self.__simulations = simulations
+
+    def teams(self) -> list[str]:
+        '''Returns the teams ranked, in the order of the distributions'''
+        return self.__teams
+
+    def simulations(self) -> int:
+        '''Returns the number of simulations'''
+        return self.__simulations
+
+    def rank_counts(self) -> np.ndarray:
+        '''Returns how often each team finished at each rank, starting from first'''
+        return self.__rank_counts
+
+    def ranking_point_counts(self) -> np.ndarray:
+        '''Returns how often each team finished with each total of ranking points, starting from 0'''
+        return self.__ranking_point_counts
+
+    def rank_probabilities(self) -> np.ndarray:
+        '''Returns the probability of each team finishing at each rank, starting from first'''
+        return self.__rank_counts / self.__simulations
+
+    def ranking_point_probabilities(self) -> np.ndarray:
+        '''Returns the probability of each team finishing with each total of ranking points'''
+        return self.__ranking_point_counts / self.__simulations
+
+    def merge(self, other: 'Rankings') -> 'Rankings':
+        '''Returns the distribution of both runs'''
+        if self.__teams != other.__teams:
+            raise ValueError('Rankings are for different teams')
+        return Rankings(self.__teams, self.__rank_counts + other.__rank_counts,
+                        self.__ranking_point_counts + other.__ranking_point_counts,
+                        self.__simulations + other.__simulations)
+
+    def table(self) -> StatsTable:
+        '''Returns each team's mean rank and ranking points and chance of ranking first or top 8'''
+        ranks = self.rank_probabilities()
+        points = self.ranking_point_probabilities()
+        return StatsTable({
+            'team_key': self.__teams,
+            'team_number': np.array([Team.team_key_to_number(team) for team in self.__teams],
+                                    dtype=np.int64),
+            'mean_rank': ranks @ np.arange(1, ranks.shape[1] + 1),
+            'mean_ranking_points': points @ np.arange(points.shape[1]),
+            'first': ranks[:, 0],
+            'top_8': ranks[:, :8].sum(axis=1)
+        }, len(self.__teams))
+
+    def __str__(self) -> str:
+        '''Returns a string representation of these rankings'''
+        return f"{len(self.__teams), self.__simulations}"
+
+
+class RankingSimulator:
+    '''
+    Simulates the remaining qualification matches of an event to find the
+    distribution of its rankings. Played matches keep their results.
+
+    Each team contributes its EPA to its alliance's score, with a normally
+    distributed error of standard deviation `deviation` times the mean EPA
+    of the event's teams unless given per team in `deviations`. An
+    alliance earns each bonus ranking point with the sum of its teams'
+    ranking point EPAs as the probability. Teams are ranked by ranking
+    points per match, then by mean alliance score.
+    '''
+
+    # Number of simulations run at once, bounding the memory used
+    __BATCH = 2000
+
+    def __init__(self, schedule: list[Match], ratings: StatsTable, epa: str = 'epa_end',
+                 deviation: float = 0.35, deviations: dict[str, float] | None = None,
+                 win_points: int = 2, tie_points: int = 1):
+        '''
+        `ratings` holds a row of TeamEventStats or TeamYearStats per team,
+        `epa` names the column used for scores, with `rp_1_<epa>` and
+        `rp_2_<epa>` used for the bonus ranking points.
+        '''
+        schedule = [match for match in schedule if match.is_qualification()]
+        teams = sorted({team for match in schedule
+                        for alliance in (match.red_teams(), match.blue_teams())
+                        for team in alliance.teams()}, key=Team.team_key_to_number)
+        self.__teams = teams
+        index = {team: i for i, team in enumerate(teams)}
+        size = len(teams)
+        self.__win_points = win_points
+        self.__tie_points = tie_points
+
+        # Played matches give each team a fixed start, index `size` stands in
+        # for an empty station and is dropped
+        points = np.zeros(size + 1, dtype=np.int64)
+        scores = np.zeros(size + 1, dtype=np.float64)
+        counted = np.zeros(size + 1, dtype=np.int64)
+        remaining = []
+        for match in schedule:
+            stations = []
+            for alliance in (match.red_teams(), match.blue_teams()):
+                # Surrogate appearances don't count toward a team's ranking
+                row = [(index[team], team not in alliance.surrogate()) for team in alliance.teams()][:3]
+                stations.append(row + [(size, False)] * (3 - len(row)))
+            if match.red_score() < 0 or match.blue_score() < 0:
+                remaining.append(stations[0] + stations[1])
+                continue
+            breakdown = match.score_breakdown()
+            for color, alliance, row, own, against in (
+                    ('red', match.red_teams(), stations[0], match.red_score(), match.blue_score()),
+                    ('blue', match.blue_teams(), stations[1], match.blue_score(), match.red_score())):
+                if breakdown is not None and isinstance(breakdown.get(color, {}).get('rp'), int):
+                    earned = breakdown[color]['rp']
+                else:
+                    earned = win_points if own > against else tie_points if own == against else 0
+                for (team, counts), key in zip(row, alliance.teams()):
+                    if counts:
+                        counted[team] += 1
+                        scores[team] += own
+                        if key not in alliance.disqualified():
+                            points[team] += earned
+        self.__points = points[:size]
+        self.__scores = scores[:size]
+        remaining = np.array(remaining, dtype=object).reshape(-1, 6, 2)
+        self.__stations = remaining[:, :, 0].astype(np.int64)
+        self.__counts = remaining[:, :, 1].astype(bool)
+        left = np.zeros(size + 1, dtype=np.int64)
+        np.add.at(left, self.__stations.ravel(), self.__counts.ravel())
+        self.__matches = np.maximum(counted[:size] + left[:size], 1)
+        # The most points a team can finish with, so every run has the same shape
+        self.__most = int((self.__points + (win_points + 2) * left[:size]).max(initial=0))
+
+        self.__epa, self.__rp_1, self.__rp_2 = (
+            np.append(column, 0) for column in _columns(teams, ratings, (epa, f"rp_1_{epa}", f"rp_2_{epa}")))
+        self.__variance = np.append(_variances(teams, self.__epa[:size], deviation, deviations), 0)
+
+    def teams(self) -> list[str]:
+        '''Returns the teams ranked, in the order of the distributions'''
+        return self.__teams
+
+    def remaining(self) -> int:
+        '''Returns the number of matches left to simulate'''
+        return len(self.__stations)
+
+    def simulate(self, simulations: int, seed: int | np.random.SeedSequence | None = None) -> Rankings:
+        '''Run a number of simulations in this process'''
+        generator = np.random.default_rng(seed)
+        size = len(self.__teams)
+        most = self.__most
+        rank_counts = np.zeros((size, size), dtype=np.int64)
+        point_counts = np.zeros((size, most + 1), dtype=np.int64)
+        # Maps each counted station of the remaining matches to its team
+        incidence = np.zeros((self.__stations.size, size + 1), dtype=np.float64)
+        incidence[np.arange(self.__stations.size), self.__stations.ravel()] = self.__counts.ravel()
+        incidence = incidence[:, :size]
+        mean = self.__epa[self.__stations].reshape(-1, 2, 3).sum(axis=2)
+        spread = np.sqrt(self.__variance[self.__stations].reshape(-1, 2, 3).sum(axis=2))
+        bonus = [np.clip(rp[self.__stations].reshape(-1, 2, 3).sum(axis=2), 0, 1)
+                 for rp in (self.__rp_1, self.__rp_2)]
+        teams = np.arange(size)
+        for start in range(0, simulations, RankingSimulator.__BATCH):
+            batch = min(RankingSimulator.__BATCH, simulations - start)
+            scores = np.maximum(np.rint(mean + spread * generator.standard_normal((batch, *mean.shape))), 0)
+            red, blue = scores[:, :, 0], scores[:, :, 1]
+            earned = np.stack([
+                np.where(red > blue, self.__win_points, np.where(red == blue, self.__tie_points, 0)),
+                np.where(blue > red, self.__win_points, np.where(red == blue, self.__tie_points, 0))
+            ], axis=2)
+            for chance in bonus:
+                earned += generator.random((batch, *chance.shape)) < chance
+            points = self.__points + np.repeat(earned, 3, axis=2).reshape(batch, -1) @ incidence
+            points = np.rint(points).astype(np.int64)
+            totals = self.__scores + np.repeat(scores, 3, axis=2).reshape(batch, -1) @ incidence
+            order = np.lexsort((generator.random((batch, size)), -totals / self.__matches,
+                                -points / self.__matches), axis=-1)
+            ranks = np.empty_like(order)
+            np.put_along_axis(ranks, order, np.broadcast_to(np.arange(size), order.shape), axis=1)
+            rank_counts += np.bincount((teams * size + ranks).ravel(),
+                                       minlength=size * size).reshape(size, size)
+            point_counts += np.bincount((teams * (most + 1) + points).ravel(),
+                                        minlength=size * (most + 1)).reshape(size, most + 1)
+        return Rankings(self.__teams, rank_counts, point_counts, simulations)
+
+    def run(self, simulations: int = 10000, processes: int | None = 1,
+            seed: int | None = None) -> Rankings:
+        '''
+        Run a number of simulations, split across a pool of `processes`
+        worker processes unless it's 1. Runs with the same seed and number of
+        processes give the same distribution.
+        '''
+        if processes == 1 or simulations <= RankingSimulator.__BATCH:
+            return self.simulate(simulations, seed)
+        workers = processes if processes is not None else os.cpu_count() or 1
+        with ProcessPoolExecutor(workers) as executor:
+            sizes = [simulations // workers + (i < simulations % workers) for i in range(workers)]
+            seeds = np.random.SeedSequence(seed).spawn(workers)
+            results = list(executor.map(self.simulate, sizes, seeds))
+        rankings = results[0]
+        for result in results[1:]:
+            rankings = rankings.merge(result)
+        return rankings
+
+
+def win_probabilities(alliances: list[list[str]], ratings: StatsTable, epa: str = 'epa_end',
+                      deviation: float = 0.35, deviations: dict[str, float] | None = None
+                      ) -> np.ndarray:
+    '''
+    Returns the probability of each alliance beating each other alliance in a
+    match, with scores distributed as in `RankingSimulator`. The first three
+    teams of an alliance play, any backup doesn't.
+    '''
+    teams = sorted({team for alliance in alliances for team in alliance[:3]},
+                   key=Team.team_key_to_number)
+    index = {team: i for i, team in enumerate(teams)}
+    [team_epa] = _columns(teams, ratings, (epa,))
+    team_variance = _variances(teams, team_epa, deviation, deviations)
+    members = np.zeros((len(alliances), len(teams)), dtype=np.float64)
+    for i, alliance in enumerate(alliances):
+        members[i, [index[team] for team in alliance[:3]]] = 1
+    mean = members @ team_epa
+    variance = members @ team_variance
+    return _beats(mean, variance, mean, variance)
+
+
+def _beats(mean: np.ndarray, variance: np.ndarray, other_mean: np.ndarray,
+           other_variance: np.ndarray) -> np.ndarray:
+    '''Returns the probability of each alliance outscoring each other alliance'''
+    spread = np.sqrt(variance[:, None] + other_variance[None, :])
+    difference = mean[:, None] - other_mean[None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scaled = np.where(spread > 0, difference / (spread * math.sqrt(2)), np.sign(difference) * np.inf)
+    return 0.5 * (1 + np.vectorize(math.erf, otypes=[np.float64])(scaled))
+
+
+def _series(probabilities: np.ndarray, series: int) -> np.ndarray:
+    '''Returns the probability of winning a majority of a series from that of winning a match'''
+    wins = series // 2 + 1
+    # Summed over the number of matches lost before the last win
+    return sum(math.comb(wins - 1 + losses, losses) * probabilities ** wins *
+               (1 - probabilities) ** losses for losses in range(wins))
+
+
+class BracketSimulator:
+    '''
+    Simulates the playoff bracket of an event from the probability of each
+    alliance beating each other alliance in a match, as given by
+    `win_probabilities`. Alliances are given in seed order.
+
+    Single elimination brackets of 4, 8 or 16 alliances play a series in
+    every round. The 8 alliance double elimination bracket plays single
+    matches in rounds 1 to 5 and a series in the finals.
+    '''
+
+    # Bracket positions of the seeds in the first round of single elimination
+    __SEEDS = {
+        4: (1, 4, 2, 3),
+        8: (1, 8, 4, 5, 2, 7, 3, 6),
+        16: (1, 16, 8, 9, 4, 13, 5, 12, 2, 15, 7, 10, 3, 14, 6, 11)
+    }
+    __ROUNDS = {
+        4: ('semifinals', 'finals'),
+        8: ('quarterfinals', 'semifinals', 'finals'),
+        16: ('eighthfinals', 'quarterfinals', 'semifinals', 'finals')
+    }
+    __DOUBLE_ELIMINATION_ROUNDS = ('round_1', 'round_2', 'round_3', 'round_4', 'round_5', 'finals')
+
+    @staticmethod
+    def for_event(event: Event, probabilities: np.ndarray, series: int = 3) -> 'BracketSimulator':
+        '''Returns a simulator for the playoff format of an event'''
+        if event.is_double_elimination_event():
+            return BracketSimulator(probabilities, True, series)
+        if event.is_bracket_event():
+            return BracketSimulator(probabilities, False, series)
+        raise ValueError(f"{event.playoff_type_str()} playoffs can't be simulated")
+
+    def __init__(self, probabilities: np.ndarray, double_elimination: bool = False,
+                 series: int = 3):
+        '''`series` is the number of matches in a series, the first to win a majority wins it'''
+        alliances = len(probabilities)
+        if double_elimination and alliances != 8:
+            raise ValueError('Double elimination brackets have 8 alliances')
+        if not double_elimination and alliances not in BracketSimulator.__SEEDS:
+            raise ValueError('Elimination brackets have 4, 8 or 16 alliances')
+        self.__double_elimination = double_elimination
+        self.__match = np.asarray(probabilities, dtype=np.float64)
+        self.__series = _series(self.__match, series)
+
+    @staticmethod
+    def positions(alliances: int) -> tuple[int, ...]:
+        '''Returns the seeds of a single elimination bracket in bracket order'''
+        return BracketSimulator.__SEEDS[alliances]
+
+    def rounds(self) -> tuple[str, ...]:
+        '''Returns the names of the rounds of this bracket'''
+        if self.__double_elimination:
+            return BracketSimulator.__DOUBLE_ELIMINATION_ROUNDS
+        return BracketSimulator.__ROUNDS[len(self.__match)]
+
+    def simulate(self, simulations: int = 100000, seed: int | None = None) -> StatsTable:
+        '''
+        Returns the probability of each alliance winning a match, or series,
+        in each round, the finals giving its chance of winning the event
+        '''
+        generator = np.random.default_rng(seed)
+        alliances = len(self.__match)
+        if self.__double_elimination:
+            winners = self.__double_elimination_winners(generator, simulations)
+        else:
+            winners = self.__single_elimination_winners(generator, simulations)
+        columns: dict[str, np.ndarray] = {'alliance': np.arange(1, alliances + 1)}
+        for name, round_winners in zip(self.rounds(), winners):
+            columns[name] = np.bincount(np.concatenate(round_winners), minlength=alliances) / simulations
+        return StatsTable(columns, alliances)
+
+    @staticmethod
+    def __play(generator: np.random.Generator, probabilities: np.ndarray,
+               first: np.ndarray, second: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        '''Returns the winners and losers of a match, or series, in each simulation'''
+        won = generator.random(first.shape) < probabilities[first, second]
+        return np.where(won, first, second), np.where(won, second, first)
+
+    def __single_elimination_winners(self, generator: np.random.Generator,
+                                     simulations: int) -> list[list[np.ndarray]]:
+        seeds = np.array(BracketSimulator.__SEEDS[len(self.__match)]) - 1
+        alive = np.broadcast_to(seeds, (simulations, len(seeds)))
+        winners = []
+        while alive.shape[1] > 1:
+            alive, _ = BracketSimulator.__play(generator, self.__series, alive[:, 0::2], alive[:, 1::2])
+            winners.append([alive.ravel()])
+        return winners
+
+    def __double_elimination_winners(self, generator: np.random.Generator,
+                                     simulations: int) -> list[list[np.ndarray]]:
+        def seed(number: int) -> np.ndarray:
+            return np.full(simulations, number - 1)
+
+        def play(first: np.ndarray, second: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            return BracketSimulator.__play(generator, self.__match, first, second)
+
+        # Matches are numbered as in the FRC double elimination bracket
+        w1, l1 = play(seed(1), seed(8))
+        w2, l2 = play(seed(4), seed(5))
+        w3, l3 = play(seed(2), seed(7))
+        w4, l4 = play(seed(3), seed(6))
+        w5, _ = play(l1, l2)
+        w6, _ = play(l3, l4)
+        w7, l7 = play(w1, w2)
+        w8, l8 = play(w3, w4)
+        w9, _ = play(l7, w6)
+        w10, _ = play(l8, w5)
+        w11, l11 = play(w7, w8)
+        w12, _ = play(w10, w9)
+        w13, _ = play(l11, w12)
+        champion, _ = BracketSimulator.__play(generator, self.__series, w11, w13)
+        return [[w1, w2, w3, w4], [w5, w6, w7, w8], [w9, w10], [w11, w12], [w13], [champion]]
+
+
+# Chooses a pick for an alliance from the available teams in rank order
+Strategy = Callable[[list[str], list[str]], str]
+
+
+class AllianceSelection:
+    '''
+    Simulates alliance selection and scores picks by the chance of the
+    picking alliance winning the playoffs.
+
+    Captains pick in rank order in the first round and reverse order in the
+    second, and a captain picked by a higher seed is replaced by the next
+    highest ranked team. Captains pick with their strategy in `strategies`,
+    or the team with the highest EPA that's available otherwise.
+
+    Single elimination brackets are scored exactly, memoizing each
+    sub-bracket's winner distribution by the alliances in it, so candidates
+    that leave part of the bracket unchanged reuse it. Double elimination
+    brackets are simulated, memoized by the alliances in them.
+    '''
+
+    # Number of alliances in each bracket playoff type
+    __ALLIANCES = {0: 8, 1: 16, 2: 4, 5: 8}
+
+    @staticmethod
+    def for_event(event: Event, rankings: list[str], ratings: StatsTable,
+                  **kwargs) -> 'AllianceSelection':
+        '''Returns an alliance selection for the playoff format of an event'''
+        if event.playoff_type() not in AllianceSelection.__ALLIANCES:
+            raise ValueError(f"{event.playoff_type_str()} playoffs can't be simulated")
+        return AllianceSelection(rankings, ratings, AllianceSelection.__ALLIANCES[event.playoff_type()],
+                                 event.is_double_elimination_event(), **kwargs)
+
+    def __init__(self, rankings: list[str], ratings: StatsTable, alliances: int = 8,
+                 double_elimination: bool = False, picks: int = 2,
+                 strategies: dict[str, Strategy] | None = None, series: int = 3,
+                 simulations: int = 20000, epa: str = 'epa_end', deviation: float = 0.35,
+                 deviations: dict[str, float] | None = None, seed: int | None = None):
+        # Validates the bracket format
+        BracketSimulator(np.full((alliances, alliances), 0.5), double_elimination, series)
+        if len(rankings) < alliances * (picks + 1):
+            raise ValueError(f"{alliances} alliances need at least {alliances * (picks + 1)} teams")
+        self.__rankings = list(rankings)
+        self.__alliances = alliances
+        self.__double_elimination = double_elimination
+        self.__picks = picks
+        self.__strategies = strategies if strategies is not None else {}
+        self.__series = series
+        self.__simulations = simulations
+        self.__seed = seed
+        [epa_column] = _columns(self.__rankings, ratings, (epa,))
+        self.__epa = dict(zip(self.__rankings, epa_column.tolist()))
+        self.__variance = dict(zip(self.__rankings, _variances(
+            self.__rankings, epa_column, deviation, deviations).tolist()))
+        self.__brackets: dict[tuple, np.ndarray] = {}
+
+    def __best_available(self, alliance: list[str], available: list[str]) -> str:
+        return max(available, key=self.__epa.__getitem__)
+
+    def select(self, made: list[str] | None = None, captain: str | None = None,
+               pick: str | None = None) -> tuple[list[list[str]], list[str]]:
+        '''
+        Simulate the rest of alliance selection after the picks in `made`,
+        with `captain` making `pick` on its next turn. Returns the alliances
+        in seed order and the teams that were available on that turn.
+        '''
+        made = list(made) if made is not None else []
+        available = list(self.__rankings)
+        alliances: list[list[str]] = []
+        offered: list[str] = []
+        for selection_round in range(self.__picks):
+            order = range(self.__alliances)
+            if selection_round % 2 == 1:
+                order = reversed(order)
+            for seed in order:
+                if seed == len(alliances):
+                    alliances.append([available.pop(0)])
+                alliance = alliances[seed]
+                if len(made) > 0:
+                    team = made.pop(0)
+                elif alliance[0] == captain and len(offered) == 0:
+                    offered = list(available)
+                    team = pick if pick is not None else \
+                        self.__strategies.get(alliance[0], self.__best_available)(alliance, available)
+                else:
+                    team = self.__strategies.get(alliance[0], self.__best_available)(alliance, available)
+                if team not in available:
+                    raise ValueError(f"{team} can't be picked")
+                available.remove(team)
+                alliance.append(team)
+        return alliances, offered
+
+    def champions(self, alliances: list[list[str]]) -> np.ndarray:
+        '''Returns each alliance's chance of winning the playoffs'''
+        teams = tuple(tuple(sorted(alliance[:3])) for alliance in alliances)
+        if self.__double_elimination:
+            if teams not in self.__brackets:
+                mean, variance = self.__strengths(teams)
+                simulator = BracketSimulator(_beats(mean, variance, mean, variance), True, self.__series)
+                self.__brackets[teams] = np.asarray(
+                    simulator.simulate(self.__simulations, self.__seed)['finals'])
+            return self.__brackets[teams]
+        positions = [seed - 1 for seed in BracketSimulator.positions(self.__alliances)]
+        winners = self.__sub_bracket(tuple(teams[seed] for seed in positions))
+        champions = np.zeros(self.__alliances)
+        champions[positions] = winners
+        return champions
+
+    def __strengths(self, teams: tuple[tuple[str, ...], ...]) -> tuple[np.ndarray, np.ndarray]:
+        mean = np.array([sum(self.__epa[team] for team in alliance) for alliance in teams])
+        variance = np.array([sum(self.__variance[team] for team in alliance) for alliance in teams])
+        return mean, variance
+
+    def __sub_bracket(self, teams: tuple[tuple[str, ...], ...]) -> np.ndarray:
+        '''Returns the chance of each alliance of a sub-bracket, in bracket order, winning it'''
+        if len(teams) == 1:
+            return np.ones(1)
+        if teams in self.__brackets:
+            return self.__brackets[teams]
+        half = len(teams) // 2
+        upper, lower = self.__sub_bracket(teams[:half]), self.__sub_bracket(teams[half:])
+        upper_mean, upper_variance = self.__strengths(teams[:half])
+        lower_mean, lower_variance = self.__strengths(teams[half:])
+        beats = _series(_beats(upper_mean, upper_variance, lower_mean, lower_variance), self.__series)
+        winners = np.concatenate([upper * (beats @ lower), lower * ((1 - beats).T @ upper)])
+        self.__brackets[teams] = winners
+        return winners
+
+    def score(self, captain: str, pick: str, made: list[str] | None = None) -> float:
+        '''Returns the chance of the captain's alliance winning the playoffs if it makes a pick'''
+        alliances, _ = self.select(made, captain, pick)
+        seed = next(i for i, alliance in enumerate(alliances) if alliance[0] == captain)
+        return float(self.champions(alliances)[seed])
+
+    def evaluate(self, captain: str, made: list[str] | None = None,
+                 candidates: list[str] | None = None, processes: int | None = 1) -> StatsTable:
+        '''
+        Score each candidate for the captain's next pick, every available team
+        by default, from most to least likely to win. Candidates are split
+        across a pool of `processes` worker processes unless it's 1, each
+        worker keeping its own memo.
+        '''
+        if candidates is None:
+            _, candidates = self.select(made, captain)
+            if len(candidates) == 0:
+                raise ValueError(f"{captain} has no picks left")
+        if processes == 1:
+            scores = [self.score(captain, candidate, made) for candidate in candidates]
+        else:
+            workers = processes if processes is not None else os.cpu_count() or 1
+            with ProcessPoolExecutor(workers) as executor:
+                scores = list(executor.map(self.score, [captain] * len(candidates), candidates,
+                                           [made] * len(candidates),
+                                           chunksize=max(len(candidates) // (4 * workers), 1)))
+        order = sorted(range(len(candidates)), key=lambda i: -scores[i])
+        return StatsTable({
+            'team_key': [candidates[i] for i in order],
+            'team_number': np.array([Team.team_key_to_number(candidates[i]) for i in order],
+                                    dtype=np.int64),
+            'win': np.array([scores[i] for i in order])
+        }, len(candidates))
@@ -0,0 +1,147 @@
+'''
+Background workers for the FRCPy cache
+'''
+from queue import Queue
+from threading import Event, Lock, Thread
+from typing import Any, Callable
+from .cache import Cache
+from .expiry import ExpiryPolicy
+
+
+class Refresher:
+    '''
+    Refreshes stale cache entries on a background thread.
+
+    The worker builds its own client through `factory` so that it has its own
+    cache connection, and refreshes an entry by calling the client method of
+    the same name with a cache expiry of zero. A failed refresh keeps the
+    stale entry, the latest failure is available through `last_error()` and
+    each is passed to `on_error` when given.
+    '''
+
+    def __init__(self, factory: Callable[[], Any],
+                 on_error: Callable[[str, tuple, Exception], None] | None = None):
+        self.__factory = factory
+        self.__on_error = on_error
+        self.__last_error: tuple[str, tuple, Exception] | None = None
+        self.__queue: Queue[tuple[str, tuple] | None] = Queue()
+        self.__pending: set[tuple[str, tuple]] = set()
+        self.__lock = Lock()
+        self.__thread: Thread | None = None
+
+    def submit(self, method: str, args: tuple) -> None:
+        '''Queue a refresh, ignoring requests that are already pending'''
+        with self.__lock:
+            if (method, args) in self.__pending:
+                return
+            self.__pending.add((method, args))
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__run, name='frcpy-refresher', daemon=True)
+                self.__thread.start()
+        self.__queue.put((method, args))
+
+    def pending(self) -> int:
+        '''Returns the number of refreshes that have not completed'''
+        with self.__lock:
+            return len(self.__pending)
+
+    def last_error(self) -> tuple[str, tuple, Exception] | None:
+        '''Returns the method, arguments and exception of the latest failed refresh'''
+        return self.__last_error
+
+    def close(self) -> None:
+        '''Finish the queued refreshes and stop the worker'''
+        with self.__lock:
+            thread = self.__thread
+            self.__thread = None
+        if thread is None:
+            return
+        self.__queue.put(None)
+        thread.join()
+
+    def __run(self) -> None:
+        with self.__factory() as api:
+            while True:
+                job = self.__queue.get()
+                if job is None:
+                    return
+                method, args = job
+                try:
+                    getattr(api, method)(*args, cache_expiry=0)
+                except Exception as error:  # pylint: disable=broad-except
+                    # The stale entry is kept and retried on its next read
+                    self.__last_error = method, args, error
+                    if self.__on_error is not None:
+                        self.__on_error(method, args, error)
+                finally:
+                    with self.__lock:
+                        self.__pending.discard(job)
+
+
+class Sweeper:
+    '''
+    Periodically sweeps expired rows from a cache, evicts rows over the
+    table budgets and compacts it on a background thread. The results of the
+    latest run are available through `report()` and are passed to `on_report`
+    when given. Pass the `expiry_policy` the cache is read with so the data it
+    keeps permanently isn't swept.
+    '''
+
+    def __init__(self, cache_dir: str = './cache', interval: float = 3600,
+                 cache_expiry: float = 90, past_season_expiry: float | None = None,
+                 expiry_policy: ExpiryPolicy | None = None,
+                 on_report: Callable[[dict[str, int], int], None] | None = None,
+                 max_rows: dict[str, int] | None = None, max_bytes: dict[str, int] | None = None):
+        self.__cache_dir = cache_dir
+        self.__max_rows = max_rows
+        self.__max_bytes = max_bytes
+        self.__interval = interval
+        self.__cache_expiry = cache_expiry
+        self.__past_season_expiry = past_season_expiry
+        self.__expiry_policy = expiry_policy
+        self.__on_report = on_report
+        self.__report: tuple[dict[str, int], int] | None = None
+        self.__stop = Event()
+        self.__thread: Thread | None = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        '''Start sweeping in the background'''
+        if self.__thread is not None:
+            return
+        self.__stop.clear()
+        self.__thread = Thread(target=self.__run, name='frcpy-sweeper', daemon=True)
+        self.__thread.start()
+
+    def stop(self) -> None:
+        '''Stop sweeping, waiting for a run in progress to finish'''
+        if self.__thread is None:
+            return
+        self.__stop.set()
+        self.__thread.join()
+        self.__thread = None
+
+    def report(self) -> tuple[dict[str, int], int] | None:
+        '''Returns the rows removed per table and bytes reclaimed by the latest run'''
+        return self.__report
+
+    def __run(self) -> None:
+        with Cache(self.__cache_dir, max_rows=self.__max_rows, max_bytes=self.__max_bytes) as cache:
+            while True:
+                rows = cache.sweep(self.__cache_expiry, self.__past_season_expiry,
+                                   self.__expiry_policy)
+                for table, evicted in cache.evict().items():
+                    rows[table] += evicted
+                # Only the first compaction rewrites the database
+                reclaimed = cache.compact(incremental=True)
+                self.__report = rows, reclaimed
+                if self.__on_report is not None:
+                    self.__on_report(rows, reclaimed)
+                if self.__stop.wait(self.__interval):
+                    return
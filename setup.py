@@ -10,7 +10,11 @@ setup(
     packages=['frcpy'],
     install_requires=[
         'tbapy',
-        'statbotics'
+        'statbotics',
+        'numpy'
     ],
+    extras_require={
+        'fast': ['orjson']
+    },
     zip_safe=False
 )